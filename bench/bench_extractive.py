@@ -0,0 +1,62 @@
+"""Benchmark: batch TF-IDF extractive summaries vs. lead sentences and a per-row loop.
+
+Run from the repo root:
+
+    python bench/bench_extractive.py --docs 100000
+
+Abstracts are built by shuffling real sentences from data/items.sqlite, so the vocabulary
+looks like arXiv text. The per-row baseline calls ``summarize_many`` once per abstract,
+which is what a non-vectorized implementation of the same scoring would cost; it runs on
+a sample and is extrapolated.
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from extractive import _SENTENCE_RE, summarize_many  # noqa: E402
+from summarize import summarize_text  # noqa: E402
+
+
+def corpus(n: int, seed: int = 0) -> list[str]:
+    conn = sqlite3.connect(str(ROOT / "data" / "items.sqlite"))
+    pool = [s for (text,) in conn.execute("SELECT summary FROM items") for s in _SENTENCE_RE.split(" ".join((text or "").split())) if s]
+    conn.close()
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(pool, rng.randint(5, 10))) for _ in range(n)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--docs", type=int, default=100000)
+    ap.add_argument("--sample", type=int, default=2000, help="abstracts timed for the per-row loop")
+    args = ap.parse_args()
+
+    texts = corpus(args.docs)
+    print(f"{len(texts)} abstracts, {sum(map(len, texts)) / 1e6:.0f} MB of text\n")
+
+    _, t_lead = timed(lambda: [summarize_text(t) for t in texts])
+    out, t_batch = timed(summarize_many, texts)
+    sample = texts[: args.sample]
+    _, t_loop = timed(lambda: [summarize_many([t])[0] for t in sample])
+    t_loop_all = t_loop * len(texts) / len(sample)
+    assert len(out) == len(texts)
+
+    print(f"{'lead sentences (summarize_text)':<36} {t_lead:>8.2f}s")
+    print(f"{'TF-IDF centrality, one batch':<36} {t_batch:>8.2f}s  {len(texts) / t_batch:>9.0f} abstracts/s")
+    print(f"{'TF-IDF centrality, per row (est.)':<36} {t_loop_all:>8.2f}s  {t_loop_all / t_batch:>8.1f}x slower")
+
+
+if __name__ == "__main__":
+    main()
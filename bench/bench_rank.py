@@ -0,0 +1,62 @@
+"""Benchmark: embedding backlog, candidate ranking and full-history scoring in rank.py.
+
+Run from the repo root:
+
+    python bench/bench_rank.py --items 250000
+
+Builds a synthetic DB with ``--items`` rows spread over three years, embeds all of them
+into a temporary vectors file, then times what build_rss and send_email do: rank the
+newest RANK_CANDIDATES on-topic items. It also times scoring every vector on disk.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from synth import generate  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--items", type=int, default=250000)
+    ap.add_argument("--candidates", type=int, default=500)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RANK_VECTORS_PATH"] = str(Path(tmp) / "vectors.f32")
+        import rank
+        from config import load_config
+        from store import search_items
+
+        conn, t_gen = timed(generate, str(Path(tmp) / "items.sqlite"), args.items)
+        print(f"Generated {args.items} items in {t_gen:.1f}s")
+        added, t_index = timed(rank.index_new, conn)
+        size = Path(os.environ["RANK_VECTORS_PATH"]).stat().st_size
+        print(f"Embedded {added} items in {t_index:.1f}s ({added / t_index:.0f}/s), {size / 1e6:.0f} MB on disk\n")
+
+        cfg = load_config(ROOT / "feeds.yaml")
+        rows = search_items(conn, limit=args.candidates)
+        runs = []
+        for _ in range(5):
+            _, t = timed(rank.rank, conn, rows, limit=50, cfg=cfg)
+            runs.append(t)
+        scores, t_all = timed(rank.score_all, conn, cfg)
+        print(f"{'rank ' + str(len(rows)) + ' candidates (best of 5)':<36} {min(runs) * 1000:>8.1f} ms")
+        print(f"{'score all ' + str(len(scores)) + ' vectors':<36} {t_all * 1000:>8.1f} ms")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Benchmark: bulk upserts / summary updates in store.py vs. the original row-at-a-time path.
+
+Run from the repo root:
+
+    python bench/bench_store.py --items 100000
+
+``--search`` times topic searches instead, on synthetic histories of the given sizes at
+a constant ~270 items a day. The index-driven search_items should stay flat as the
+history grows, while matching against items_fts as a whole grows with it:
+
+    python bench/bench_store.py --search 100000,300000,1000000
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import topics  # noqa: E402
+from store import ITEM_COLUMNS, SCHEMA, _topic_clause, connect, filter_items, search_items  # noqa: E402
+from store import complete_summary_jobs, upsert_items  # noqa: E402
+from synth import generate  # noqa: E402
+
+ITEMS_PER_DAY = 270
+
+
+def synthetic_items(n: int) -> list[dict]:
+    return [
+        {
+            "id": f"{i:064x}",
+            "source": f"source {i % 12}",
+            "title": f"Synthetic paper number {i} about agents and workflows",
+            "url": f"https://example.org/abs/{i}",
+            "published": f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00+00:00",
+            "summary": "We study a synthetic problem. " * 20,
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_connect(path: str):
+    # Baseline: default rollback journal and synchronous=FULL, as before the change
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def legacy_upsert(conn, items):
+    cur = conn.cursor()
+    for it in items:
+        cur.execute(
+            "INSERT OR IGNORE INTO items (id, source, title, url, published, summary) VALUES (?,?,?,?,?,?)",
+            (it["id"], it["source"], it["title"], it["url"], it.get("published", ""), it.get("summary", "")),
+        )
+    conn.commit()
+
+
+def legacy_set_summaries(conn, pairs):
+    for item_id, summary in pairs:
+        conn.execute("UPDATE items SET ai_summary = ? WHERE id = ?", (summary, item_id))
+        conn.commit()
+
+
+def in_batches(fn, conn, items, size=50):
+    # Steady-state shape: collect/summarize commit a few dozen rows at a time
+    for i in range(0, len(items), size):
+        fn(conn, items[i : i + size])
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def legacy_search(conn, topic_filter, since=None, limit=None):
+    # Baseline: the whole-table items_fts match, sorted afterwards
+    clause, params = _topic_clause(topic_filter)
+    sql = f"SELECT {ITEM_COLUMNS} FROM items WHERE {clause}"
+    if since is not None:
+        sql += " AND published_ts >= ?"
+        params.append(since)
+    sql += " ORDER BY published_ts DESC"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return conn.execute(sql, params).fetchall()
+
+
+def legacy_filter(conn, item_ids, match):
+    sql = (
+        "SELECT id FROM items WHERE id IN (SELECT value FROM json_each(?)) "
+        "AND rowid IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)"
+    )
+    return {r[0] for r in conn.execute(sql, (json.dumps(list(item_ids)), match))}
+
+
+def best(fn, *args, repeat: int = 3) -> float:
+    return min(timed(fn, *args) for _ in range(repeat))
+
+
+def search_bench(sizes: list[int], tmp: str):
+    print(f"{'items':>9}  {'query':<22}  {'legacy':>8}  {'indexed':>8}  {'speedup':>7}")
+    for n in sizes:
+        conn = generate(str(Path(tmp) / f"search-{n}.sqlite"), n, span_days=max(30, n // ITEMS_PER_DAY))
+        topic_filter = topics()
+        week = int(time.time()) - 7 * 86400
+        week_ids = [r[0] for r in search_items(conn, since=week)]
+        cases = [
+            ("topics, limit 500", search_items, legacy_search, (topic_filter, None, 500)),
+            ("topics, last 7 days", search_items, legacy_search, (topic_filter, week)),
+            ("filter_items, 1 week", filter_items, legacy_filter, (week_ids, '"agent"*')),
+        ]
+        for name, new, old, args in cases:
+            t_old, t_new = best(old, conn, *args), best(new, conn, *args)
+            print(f"{n:>9}  {name:<22}  {t_old:>7.3f}s  {t_new:>7.3f}s  {t_old / t_new:>6.1f}x")
+        conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--items", type=int, default=100000)
+    ap.add_argument("--dir", default=None, help="directory for the scratch DBs (defaults to a temp dir)")
+    ap.add_argument("--search", metavar="SIZES", help="time topic searches on histories of these sizes")
+    args = ap.parse_args()
+
+    if args.search:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            search_bench([int(n) for n in args.search.split(",")], tmp)
+        return
+
+    items = synthetic_items(args.items)
+    pairs = [(it["id"], f"Summary {i}") for i, it in enumerate(items)]
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        old = legacy_connect(str(Path(tmp) / "legacy.sqlite"))
+        new = connect(str(Path(tmp) / "bulk.sqlite"))
+        results = [
+            ("upsert, 1 commit", timed(legacy_upsert, old, items), timed(upsert_items, new, items)),
+            ("ai_summary update", timed(legacy_set_summaries, old, pairs), timed(complete_summary_jobs, new, pairs)),
+        ]
+        old.close()
+        new.close()
+
+        old = legacy_connect(str(Path(tmp) / "legacy-batched.sqlite"))
+        new = connect(str(Path(tmp) / "bulk-batched.sqlite"))
+        results.append(
+            (
+                "upsert, 50/commit",
+                timed(in_batches, legacy_upsert, old, items),
+                timed(in_batches, upsert_items, new, items),
+            )
+        )
+        old.close()
+        new.close()
+
+    print(f"{args.items} synthetic items\n")
+    print(f"{'operation':<18}  {'legacy':>9}  {'bulk':>8}  {'legacy/s':>10}  {'bulk/s':>10}  {'speedup':>7}")
+    for name, t_old, t_new in results:
+        print(
+            f"{name:<18}  {t_old:>8.2f}s  {t_new:>7.2f}s  {args.items / t_old:>10.0f}  {args.items / t_new:>10.0f}"
+            f"  {t_old / t_new:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
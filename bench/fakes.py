@@ -0,0 +1,352 @@
+"""Local stand-ins for arXiv (feeds and the paged API), Gemini and an SMTP server, used by the benchmarks.
+
+Each server runs on 127.0.0.1 in a daemon thread and is started with ``start()``,
+which returns its base URL (or port). None of them needs network access.
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "agent workflow model learning graph neural network benchmark reasoning language "
+    "retrieval planning tool coding assistant evaluation dataset optimization policy "
+    "robust efficient scalable transformer diffusion alignment safety human feedback"
+).split()
+
+
+def synthetic_text(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    sentences = [" ".join(words[i : i + 15]).capitalize() + "." for i in range(0, len(words), 15)]
+    return " ".join(sentences)
+
+
+def arxiv_feed(feed_id: str, entries: int, seed: int = 0, newest: datetime | None = None) -> bytes:
+    """An arXiv-API-shaped Atom document with ``entries`` synthetic papers, newest first."""
+    rng = random.Random(f"{feed_id}:{seed}")
+    newest = newest or datetime(2026, 1, 1, tzinfo=timezone.utc)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">',
+        f"<title>{escape(feed_id)}</title>",
+        f"<updated>{datetime.now(timezone.utc).isoformat()}</updated>",
+    ]
+    for i in range(entries):
+        published = (newest - timedelta(minutes=7 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        num = f"{2600 + (i // 100000) % 100:04d}.{i % 100000:05d}"
+        parts.append(
+            "<entry>"
+            f"<id>http://arxiv.org/abs/{num}v1</id>"
+            f"<published>{published}</published><updated>{published}</updated>"
+            f"<title>{escape(synthetic_text(rng, 10).rstrip('.'))}</title>"
+            f"<summary>{escape(synthetic_text(rng, 150))}</summary>"
+            f'<link href="http://arxiv.org/abs/{num}v1" rel="alternate" type="text/html"/>'
+            "</entry>"
+        )
+    parts.append("</feed>")
+    return "\n".join(parts).encode("utf-8")
+
+
+class _Server:
+    def __init__(self):
+        self.httpd = None
+        self.thread = None
+
+    def _serve(self, httpd):
+        self.httpd = httpd
+        self.thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return httpd.server_address[1]
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+class FeedServer(_Server):
+    """Serves ``/feed/<name>.xml`` as a synthetic arXiv feed.
+
+    ``entries`` and ``latency`` (seconds per response) are configurable. Responses carry
+    an ETag and honour If-None-Match, like a well-behaved feed host.
+    """
+
+    def __init__(self, entries: int = 50, latency: float = 0.0):
+        super().__init__()
+        self.entries = entries
+        self.latency = latency
+        self.requests = 0
+        self._bodies: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def body(self, name: str) -> bytes:
+        with self._lock:
+            if name not in self._bodies:
+                self._bodies[name] = arxiv_feed(name, self.entries)
+            return self._bodies[name]
+
+    def start(self) -> str:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                name = self.path.split("?")[0].rsplit("/", 1)[-1].removesuffix(".xml")
+                body = server.body(name)
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/atom+xml")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        port = self._serve(ThreadingHTTPServer(("127.0.0.1", 0), Handler))
+        return f"http://127.0.0.1:{port}"
+
+
+class ArxivApiServer(_Server):
+    """Serves ``/api/query`` like the arXiv API, for the backfill benchmark.
+
+    Every category in ``cat:<name>`` gets ``per_day`` synthetic papers a day. The
+    ``submittedDate:[... TO ...]`` range, ``start`` and ``max_results`` are honoured,
+    and the result count is reported as ``opensearch:totalResults``. ``request_times``
+    records when each request arrived, to check the client's pacing.
+    """
+
+    _RANGE_RE = re.compile(r"submittedDate:\[(\d{8})\d{4} TO (\d{8})\d{4}\]")
+
+    def __init__(self, per_day: int = 150, latency: float = 0.0):
+        super().__init__()
+        self.per_day = per_day
+        self.latency = latency
+        self.request_times: list[float] = []
+        self._lock = threading.Lock()
+
+    def page(self, query: str, start: int, size: int) -> bytes:
+        cat = re.search(r"cat:([\w.\-]+)", query)
+        cat = cat.group(1) if cat else "all"
+        m = self._RANGE_RE.search(query)
+        lo = datetime.strptime(m.group(1), "%Y%m%d").replace(tzinfo=timezone.utc)
+        hi = datetime.strptime(m.group(2), "%Y%m%d").replace(tzinfo=timezone.utc)
+        total = ((hi - lo).days + 1) * self.per_day
+        step = timedelta(days=1) / self.per_day
+        newest = hi + timedelta(days=1) - step
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">',
+            f"<title>{escape(query)}</title>",
+            f'<opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{total}</opensearch:totalResults>',
+        ]
+        for i in range(start, min(start + size, total)):
+            published = newest - step * i
+            rng = random.Random(f"{cat}:{published.isoformat()}")
+            num = f"{cat}-{published.timestamp():.0f}"
+            stamp = published.strftime("%Y-%m-%dT%H:%M:%SZ")
+            parts.append(
+                "<entry>"
+                f"<id>http://arxiv.org/abs/{num}v1</id>"
+                f"<published>{stamp}</published><updated>{stamp}</updated>"
+                f"<title>{escape(synthetic_text(rng, 10).rstrip('.'))}</title>"
+                f"<summary>{escape(synthetic_text(rng, 150))}</summary>"
+                f'<link href="http://arxiv.org/abs/{num}v1" rel="alternate" type="text/html"/>'
+                "</entry>"
+            )
+        parts.append("</feed>")
+        return "\n".join(parts).encode("utf-8")
+
+    def start(self) -> str:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_times.append(time.monotonic())
+                time.sleep(server.latency)
+                params = parse_qs(urlsplit(self.path).query)
+                body = server.page(
+                    params["search_query"][0], int(params.get("start", ["0"])[0]), int(params["max_results"][0])
+                )
+                self.send_response(200)
+                self.send_header("Content-Type", "application/atom+xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        port = self._serve(ThreadingHTTPServer(("127.0.0.1", 0), Handler))
+        return f"http://127.0.0.1:{port}/api/query"
+
+
+class GeminiServer(_Server):
+    """A fake ``generateContent`` endpoint; point GEMINI_ENDPOINT at ``start()``'s URL.
+
+    Each call sleeps ``latency`` seconds. A ``fail_rate`` fraction of calls answers 429
+    with ``Retry-After: 0``. Requests that ask for JSON output (batch mode) get one
+    summary per submitted abstract. Responses carry ``usageMetadata`` token counts, and
+    ``tokens`` totals them.
+    """
+
+    def __init__(self, latency: float = 0.05, fail_rate: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.calls = 0
+        self.throttled = 0
+        self.tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def start(self) -> str:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+                with server._lock:
+                    server.calls += 1
+                    throttle = server._rng.random() < server.fail_rate
+                    server.throttled += throttle
+                time.sleep(server.latency)
+                if throttle:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                prompt = payload["contents"][0]["parts"][0]["text"]
+                config = payload.get("generationConfig", {})
+                if config.get("responseMimeType") == "application/json":
+                    start = prompt.find("[{")
+                    abstracts = json.loads(prompt[start:]) if start != -1 else []
+                    text = json.dumps([{"id": a["id"], "summary": a["abstract"][:200]} for a in abstracts])
+                else:
+                    text = "Synthetic summary: " + " ".join(prompt.split()[-40:])
+                # Token counts at the usual ~4 characters per token, as Gemini reports them
+                usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+                usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+                with server._lock:
+                    server.tokens += usage["totalTokenCount"]
+                body = json.dumps(
+                    {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}], "usageMetadata": usage}
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        port = self._serve(ThreadingHTTPServer(("127.0.0.1", 0), Handler))
+        return f"http://127.0.0.1:{port}/v1beta/models/fake:generateContent"
+
+
+class SmtpSink(_Server):
+    """Minimal SMTP server that accepts AUTH PLAIN/LOGIN and keeps delivered messages.
+
+    It does not offer STARTTLS, so run send_email with SMTP_STARTTLS=0. With
+    ``max_per_session`` set, it drops the connection after that many messages, as
+    servers that cap messages per session do.
+    """
+
+    def __init__(self, latency: float = 0.0, max_per_session: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.max_per_session = max_per_session
+        self.sessions = 0
+        self.messages: list[tuple[str, list[str], bytes]] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> int:
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write((line + "\r\n").encode())
+
+            def handle(self):
+                with server._lock:
+                    server.sessions += 1
+                self.reply("220 sink ESMTP")
+                sender, rcpts, delivered = None, [], 0
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                    cmd = line[:4].upper()
+                    if cmd in ("EHLO", "HELO"):
+                        self.wfile.write(b"250-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                    elif line.upper().startswith("AUTH LOGIN"):
+                        self.reply("334 " + base64.b64encode(b"Username:").decode())
+                        self.rfile.readline()
+                        self.reply("334 " + base64.b64encode(b"Password:").decode())
+                        self.rfile.readline()
+                        self.reply("235 ok")
+                    elif cmd == "AUTH":
+                        self.reply("235 ok")
+                    elif cmd == "MAIL":
+                        if server.max_per_session and delivered >= server.max_per_session:
+                            return
+                        sender, rcpts = line.split(":", 1)[1].strip(" <>"), []
+                        self.reply("250 ok")
+                    elif cmd == "RCPT":
+                        rcpts.append(line.split(":", 1)[1].strip(" <>"))
+                        self.reply("250 ok")
+                    elif cmd == "DATA":
+                        self.reply("354 go ahead")
+                        data = []
+                        while True:
+                            chunk = self.rfile.readline()
+                            if not chunk or chunk == b".\r\n":
+                                break
+                            data.append(chunk)
+                        time.sleep(server.latency)
+                        with server._lock:
+                            server.messages.append((sender, rcpts, b"".join(data)))
+                        delivered += 1
+                        self.reply("250 queued")
+                    elif cmd == "RSET":
+                        sender, rcpts = None, []
+                        self.reply("250 ok")
+                    elif cmd == "NOOP":
+                        self.reply("250 ok")
+                    elif cmd == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("502 not implemented")
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        return self._serve(Server(("127.0.0.1", 0), Handler))
@@ -0,0 +1,233 @@
+"""End-to-end pipeline benchmark against local stand-ins for arXiv, Gemini and SMTP.
+
+    python bench/run_bench.py --items 20000 --sources 20 --feed-latency 0.2
+
+A synthetic DB with ``--items`` rows of history is generated first. The benchmark
+then runs each stage of ai_digest.STAGES one at a time and reports throughput and
+latency per stage. Results are saved to bench/results/<commit>-<timestamp>.json and
+compared with the most recent earlier result, or with the file given to ``--compare``.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fakes import FeedServer, GeminiServer, SmtpSink  # noqa: E402
+from synth import generate  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _timer(snap: dict, name: str) -> dict:
+    count = sum(t["count"] for t in snap["timers"] if t["name"] == name)
+    total = sum(t["sum"] for t in snap["timers"] if t["name"] == name)
+    peak = max((t["max"] for t in snap["timers"] if t["name"] == name), default=0.0)
+    return {"count": count, "mean": total / count if count else 0.0, "max": peak}
+
+
+def _counter(snap: dict, name: str, **labels) -> float:
+    return sum(
+        c["value"]
+        for c in snap["counters"]
+        if c["name"] == name and all(c["labels"].get(k) == str(v) for k, v in labels.items())
+    )
+
+
+def run_stages(conn, args, feeds: FeedServer, gemini: GeminiServer, smtp: SmtpSink) -> dict:
+    import ai_digest
+    import metrics
+
+    results = {}
+    for stage in ai_digest.STAGES:
+        pending = conn.execute("SELECT COUNT(*) FROM items WHERE ai_summary IS NULL OR ai_summary = ''").fetchone()[0]
+        sent_before = len(smtp.messages)
+        metrics.reset()
+        start = time.perf_counter()
+        ai_digest.run([stage], conn=conn)
+        wall = time.perf_counter() - start
+        snap = metrics.snapshot()
+
+        if stage == "collect":
+            work = args.sources * args.feed_entries
+            latency = _timer(snap, "collect_fetch_seconds")
+            extra = {"requests": feeds.requests, "items_stored": _counter(snap, "collect_items_total")}
+        elif stage == "summarize":
+            work = _counter(snap, "summarize_items_total")
+            latency = _timer(snap, "llm_request_seconds")
+            extra = {
+                "pending_before": pending,
+                "llm_calls": gemini.calls,
+                "llm_tokens": gemini.tokens,
+                "budget_skipped": _counter(snap, "summarize_budget_skipped_total"),
+                "throttled": gemini.throttled,
+                "retries": _counter(snap, "llm_retries_total"),
+                "ratelimit_wait_s": _timer(snap, "llm_ratelimit_wait_seconds")["mean"]
+                * _timer(snap, "llm_ratelimit_wait_seconds")["count"],
+            }
+        elif stage == "rank":
+            work = _counter(snap, "rank_items_embedded_total")
+            latency = _timer(snap, "rank_index_seconds")
+            extra = {}
+        elif stage == "rss":
+            work = 50
+            latency = _timer(snap, "render_seconds")
+            extra = {}
+        elif stage == "site":
+            work = _counter(snap, "site_files_written_total")
+            latency = _timer(snap, "site_compress_seconds")
+            extra = {}
+        else:
+            work = len(smtp.messages) - sent_before
+            latency = _timer(snap, "email_send_seconds")
+            extra = {
+                "smtp_sessions": _counter(snap, "email_connections_total"),
+                "reconnects": _counter(snap, "email_reconnects_total"),
+                "failed": _counter(snap, "email_failed_total"),
+            }
+        results[stage] = {
+            "wall_s": wall,
+            "units": work,
+            "throughput_per_s": work / wall if wall else 0.0,
+            "latency_mean_s": latency["mean"],
+            "latency_max_s": latency["max"],
+            **extra,
+        }
+    return results
+
+
+def _print(results: dict, previous: dict | None):
+    print(f"\n{'stage':<10} {'wall':>8} {'units':>8} {'units/s':>10} {'lat mean':>9} {'lat max':>9}  vs prev")
+    for stage, r in results.items():
+        delta = ""
+        if previous and stage in previous.get("stages", {}):
+            old = previous["stages"][stage]["wall_s"]
+            if old:
+                delta = f"{(r['wall_s'] - old) / old:+.1%}"
+        print(
+            f"{stage:<10} {r['wall_s']:>7.2f}s {r['units']:>8.0f} {r['throughput_per_s']:>10.1f}"
+            f" {r['latency_mean_s'] * 1000:>7.1f}ms {r['latency_max_s'] * 1000:>7.1f}ms  {delta}"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--items", type=int, default=20000, help="rows of synthetic history in the DB")
+    ap.add_argument("--summarized", type=float, default=0.95, help="fraction of history already summarized")
+    ap.add_argument("--sources", type=int, default=20)
+    ap.add_argument("--feed-entries", type=int, default=50)
+    ap.add_argument("--feed-latency", type=float, default=0.2)
+    ap.add_argument("--gemini-latency", type=float, default=0.05)
+    ap.add_argument("--gemini-429-rate", type=float, default=0.02)
+    ap.add_argument("--rpm", type=int, default=6000)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--llm-token-budget", type=int, default=0, help="LLM_RUN_TOKEN_BUDGET (0: unlimited)")
+    ap.add_argument("--per-host", type=int, default=4, help="COLLECT_PER_HOST; all fake feeds share one host")
+    ap.add_argument("--smtp-latency", type=float, default=0.01)
+    ap.add_argument("--subscribers", type=int, default=1, help="digest recipients, each with its own keyword filter")
+    ap.add_argument("--smtp-per-session", type=int, default=0, help="sink drops the session after this many messages")
+    ap.add_argument("--smtp-rate", type=float, default=6000, help="SMTP_RATE_PER_MIN")
+    ap.add_argument("--compare", help="result JSON to compare against (default: latest in bench/results)")
+    ap.add_argument("--no-save", action="store_true")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    feeds = FeedServer(args.feed_entries, args.feed_latency)
+    gemini = GeminiServer(args.gemini_latency, args.gemini_429_rate)
+    smtp = SmtpSink(args.smtp_latency, args.smtp_per_session)
+    feeds_url = feeds.start()
+    gemini_url = gemini.start()
+    smtp_port = smtp.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        feeds_yaml = tmp / "feeds.yaml"
+        lines = ["sources:"]
+        for i in range(args.sources):
+            lines += [f"  - name: bench {i}", "    type: arxiv", f"    url: {feeds_url}/feed/{i}.xml"]
+        if args.subscribers > 1:
+            lines.append("subscribers:")
+            for i in range(args.subscribers):
+                keyword = ("agent", "productivity", "coding", "assistant", "workflow")[i % 5]
+                lines += [f"  - to: reader{i}@example.org", f"    keywords: [{keyword}]", "    max_items: 20"]
+        feeds_yaml.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        os.environ.update(
+            {
+                "AI_DIGEST_DB": str(tmp / "items.sqlite"),
+                "FEEDS_PATH": str(feeds_yaml),
+                "RSS_PATH": str(tmp / "rss.xml"),
+                "SITE_DIR": str(tmp / "site"),
+                "METRICS_DIR": str(tmp / "metrics"),
+                "COLLECT_WORKERS": str(args.workers),
+                "COLLECT_PER_HOST": str(args.per_host),
+                "USE_GEMINI": "1",
+                "GEMINI_API_KEY": "bench",
+                "GEMINI_ENDPOINT": gemini_url,
+                "GEMINI_RPM": str(args.rpm),
+                "GEMINI_BURST": str(args.workers),
+                "SUMMARIZE_WORKERS": str(args.workers),
+                "LLM_CACHE_PATH": str(tmp / "llm_cache.sqlite"),
+                "LLM_RUN_TOKEN_BUDGET": str(args.llm_token_budget),
+                "SMTP_HOST": "127.0.0.1",
+                "SMTP_PORT": str(smtp_port),
+                "SMTP_USER": "bench@example.org",
+                "SMTP_PASS": "bench",
+                "SMTP_STARTTLS": "0",
+                "SMTP_RATE_PER_MIN": str(args.smtp_rate),
+                "DIGEST_TO": "reader@example.org",
+            }
+        )
+
+        start = time.perf_counter()
+        conn = generate(os.environ["AI_DIGEST_DB"], args.items, summarized=args.summarized)
+        print(f"Generated {args.items} synthetic items in {time.perf_counter() - start:.1f}s")
+        results = run_stages(conn, args, feeds, gemini, smtp)
+        conn.close()
+
+    for server in (feeds, gemini, smtp):
+        server.stop()
+
+    previous = None
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    elif RESULTS_DIR.exists():
+        runs = sorted(RESULTS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        if runs:
+            previous = json.loads(runs[-1].read_text(encoding="utf-8"))
+    _print(results, previous)
+    if previous:
+        print(f"(compared with commit {previous.get('commit')}, {previous.get('timestamp')})")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        commit = _commit()
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        out = RESULTS_DIR / f"{commit}-{stamp}.json"
+        out.write_text(
+            json.dumps({"commit": commit, "timestamp": stamp, "params": vars(args), "stages": results}, indent=2),
+            encoding="utf-8",
+        )
+        print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Generate a synthetic items DB for benchmarks.
+
+    python bench/synth.py /tmp/bench.sqlite --items 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import synthetic_text  # noqa: E402
+from store import connect, upsert_items  # noqa: E402
+
+SOURCES = ["arXiv cs.AI", "arXiv cs.LG", "arXiv cs.CL", "arXiv cs.SE", "Vendor blog"]
+
+
+def synthetic_items(n: int, seed: int = 0, summarized: float = 0.9, span_days: int = 3 * 365):
+    """Yield ``n`` items spread evenly over the last ``span_days`` days, oldest first.
+
+    A ``summarized`` fraction of them already has an ai_summary.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    step = span_days * 86400 / max(1, n)
+    start = now - timedelta(days=span_days)
+    for i in range(n):
+        published = start + timedelta(seconds=i * step)
+        summary = synthetic_text(rng, rng.randint(120, 220))
+        yield {
+            "id": f"{seed:08x}{i:056x}",
+            "source": rng.choice(SOURCES),
+            "title": synthetic_text(rng, 10).rstrip("."),
+            "url": f"https://arxiv.org/abs/{2000 + i // 100000:04d}.{i % 100000:05d}v1",
+            "published": published.isoformat(),
+            "published_ts": int(published.timestamp()),
+            "summary": summary,
+            "ai_summary": summary[:300] if rng.random() < summarized else "",
+        }
+
+
+def generate(path: str, n: int, seed: int = 0, summarized: float = 0.9, chunk: int = 20000, span_days: int = 3 * 365):
+    conn = connect(path)
+    batch = []
+    ai = []
+    for it in synthetic_items(n, seed, summarized, span_days):
+        batch.append(it)
+        if it["ai_summary"]:
+            ai.append((it["ai_summary"], it["id"]))
+        if len(batch) >= chunk:
+            _write(conn, batch, ai)
+    _write(conn, batch, ai)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _write(conn, batch, ai):
+    upsert_items(conn, batch)
+    conn.executemany("UPDATE items SET ai_summary = ? WHERE id = ?", ai)
+    conn.commit()
+    batch.clear()
+    ai.clear()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path")
+    ap.add_argument("--items", type=int, default=100000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--summarized", type=float, default=0.9, help="fraction of items that already have an ai_summary")
+    args = ap.parse_args()
+    start = time.perf_counter()
+    generate(args.path, args.items, args.seed, args.summarized).close()
+    print(f"Wrote {args.items} items to {args.path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Run several pipeline stages in one process.
+
+    python src/ai_digest.py run --stages collect,summarize,rank,rss,site,email
+    python src/ai_digest.py search '"tool use" OR agent*' --days 30
+    python src/ai_digest.py backfill --days 365
+
+(or ``python -m ai_digest run ...`` from inside src/). All stages share one DB
+connection, and the digest overview is computed once for both the RSS feed and the
+email. Each stage module, along with its heavy dependencies (feedparser, yaml,
+requests), is imported only when that stage runs.
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import metrics
+from store import connect
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("collect", "summarize", "rank", "rss", "site", "email")
+
+
+def run(stages, conn=None, dry_run: bool = False) -> list[tuple[str, float]]:
+    """Run ``stages`` in order and return ``(stage, seconds)`` timings.
+
+    A failing stage stops the run, as a failing workflow step would. The timings are
+    logged either way.
+    """
+    conn = conn or connect()
+    timings = []
+    overall = None
+    try:
+        for name in stages:
+            if name in ("rss", "email") and overall is None:
+                start = time.perf_counter()
+                from summarize import week_overview
+
+                overall = week_overview(conn)
+                timings.append(("overview", time.perf_counter() - start))
+                metrics.observe("stage_seconds", timings[-1][1], stage="overview")
+
+            start = time.perf_counter()
+            if name == "collect":
+                import collect
+
+                collect.main(conn=conn)
+            elif name == "summarize":
+                import summarize
+
+                summarize.main(dry_run=dry_run, conn=conn)
+            elif name == "rank":
+                import rank
+
+                rank.index_new(conn)
+            elif name == "rss":
+                import build_rss
+
+                build_rss.main(conn=conn, overall=overall)
+            elif name == "site":
+                import build_site
+
+                build_site.main(conn=conn)
+            elif name == "email":
+                import send_email
+
+                send_email.main(conn=conn, overall=overall)
+            else:
+                raise ValueError(f"Unknown stage {name!r}; expected one of {', '.join(STAGES)}")
+            timings.append((name, time.perf_counter() - start))
+            metrics.observe("stage_seconds", timings[-1][1], stage=name)
+    finally:
+        _log_timings(timings)
+    return timings
+
+
+def _log_timings(timings):
+    if not timings:
+        return
+    total = sum(t for _, t in timings)
+    lines = [f"  {name:<10} {secs:8.2f}s" for name, secs in timings]
+    lines.append(f"  {'total':<10} {total:8.2f}s")
+    logger.info("Stage timings:\n%s", "\n".join(lines))
+
+
+def search(query: str | None, days: int | None = None, limit: int = 20, conn=None) -> int:
+    """Print stored items matching an FTS5 query (the configured topic filter if None).
+
+    Archived months are searched too when the query reaches back past the hot window.
+    """
+    import archive
+    from config import topics
+
+    conn = conn or connect()
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat() if days else None
+    rows = archive.search(conn, query or topics(), since=since, limit=limit)
+    for _id, source, title, url, published, *_ in rows:
+        print(f"{(published or '')[:10]}  {source}\n  {title}\n  {url}")
+    print(f"{len(rows)} item(s)")
+    return len(rows)
+
+
+def backfill(days=None, since=None, until=None, sources=None, restart=False, max_pages=None, conn=None) -> int:
+    """Page the arXiv sources through a window of days; see backfill.py."""
+    import backfill as bf
+
+    start, end = bf.window(days, since, until)
+    open_end = None if until else ("since" if since else "days")
+    return bf.backfill(
+        conn or connect(), start, end, names=sources, restart=restart, max_pages=max_pages, open_end=open_end
+    )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="ai_digest", description="AI research digest pipeline")
+    sub = ap.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="run pipeline stages in one process")
+    run_p.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"comma-separated stages to run, in order (default: {','.join(STAGES)})",
+    )
+    run_p.add_argument("--dry-run", action="store_true", help="print summaries instead of storing them")
+    search_p = sub.add_parser("search", help="query stored items with SQLite FTS5 syntax")
+    search_p.add_argument("query", nargs="?", help="FTS5 query (default: the topic filter from feeds.yaml)")
+    search_p.add_argument("--days", type=int, help="only items published in the last N days")
+    search_p.add_argument("--limit", type=int, default=20)
+    backfill_p = sub.add_parser("backfill", help="page arXiv sources through past days, resumably")
+    backfill_p.add_argument("--days", type=int, help="the last N days up to --until (default 30)")
+    backfill_p.add_argument("--since", help="first day, YYYY-MM-DD (overrides --days)")
+    backfill_p.add_argument("--until", help="last day, YYYY-MM-DD (default: today, UTC)")
+    backfill_p.add_argument(
+        "--source", action="append", dest="sources", help="arXiv source name from feeds.yaml (repeatable)"
+    )
+    backfill_p.add_argument("--restart", action="store_true", help="ignore the saved cursor for this window")
+    backfill_p.add_argument("--max-pages", type=int, help="stop after N pages; rerun to continue")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "run":
+        stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            ap.error(f"unknown stage(s): {', '.join(unknown)}")
+        metrics.run(run, stages, dry_run=args.dry_run)
+    elif args.command == "search":
+        search(args.query, days=args.days, limit=args.limit)
+    elif args.command == "backfill":
+        metrics.run(
+            backfill,
+            days=args.days,
+            since=args.since,
+            until=args.until,
+            sources=args.sources,
+            restart=args.restart,
+            max_pages=args.max_pages,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Hot/cold tiering for data/items.sqlite.
+
+Only items published in the last HOT_DAYS (default 180) stay in the DB. Older items are
+appended to monthly partitions, ``data/archive/items-YYYY-MM.jsonl.gz``. Each file is
+one JSON object per item, sorted by ``published_ts`` then id, with its ``sources``.
+Every archive run appends one new gzip member and never rewrites earlier bytes. A file
+only grows at its end, so git stores each commit as a small delta. The committed length
+of each file is recorded in ``archive_partitions``. Bytes beyond it come from a run that
+died before its DB transaction, and are cut off on the next run. The canonical key of
+each archived item stays in ``archived_keys``, so dedup keeps a re-collected or
+backfilled copy of it out of the hot DB.
+
+After pruning, the DB is vacuumed, analyzed and checkpointed so the committed file is
+as small as the hot window allows. ``search`` reads like ``store.search_items`` but also
+scans the cold partitions a query reaches into.
+
+    python src/archive.py            # archive items older than HOT_DAYS and compact
+"""
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import metrics
+from store import (
+    ITEM_COLUMNS,
+    SCHEMA,
+    SEARCH_SCHEMA,
+    add_archived_keys,
+    connect,
+    get_archive_partitions,
+    get_item_sources,
+    items_published_before,
+    rebuild_search_index,
+    restore_items,
+    save_archived,
+    search_items,
+    to_epoch,
+)
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = [c.strip() for c in ITEM_COLUMNS.split(",")] + ["canonical_key"]
+
+
+def archive_dir() -> Path:
+    default = Path(__file__).resolve().parent.parent / "data" / "archive"
+    return Path(os.environ.get("ARCHIVE_DIR", str(default)))
+
+
+def hot_days() -> int:
+    return int(os.environ.get("HOT_DAYS", "180"))
+
+
+def month_of(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m")
+
+
+def partition_path(month: str) -> Path:
+    return archive_dir() / f"items-{month}.jsonl.gz"
+
+
+def _recover(partitions: dict[str, tuple[int, int, int]]):
+    # Cut off appends whose DB transaction never committed
+    for month, (length, _items, _ts) in partitions.items():
+        path = partition_path(month)
+        size = path.stat().st_size if path.exists() else 0
+        if size > length:
+            logger.warning("%s has %d uncommitted bytes; truncating", path, size - length)
+            with open(path, "r+b") as fh:
+                fh.truncate(length)
+        elif size < length:
+            logger.error("%s is %d bytes shorter than recorded; archived items are missing", path, length - size)
+
+
+def _append(path: Path, records: list[dict]) -> int:
+    """Append ``records`` as one gzip member and return the new file length."""
+    data = "".join(json.dumps(r, ensure_ascii=False, sort_keys=True) + "\n" for r in records).encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as fh:
+        # mtime=0 keeps the member bytes a pure function of the records
+        fh.write(gzip.compress(data, 9, mtime=0))
+        fh.flush()
+        os.fsync(fh.fileno())
+        return fh.tell()
+
+
+def archive_old(conn, days: int | None = None, now: float | None = None) -> int:
+    """Move items published more than ``days`` ago into the monthly partitions."""
+    days = hot_days() if days is None else days
+    cutoff = int((now if now is not None else time.time()) - days * 86400)
+    partitions = get_archive_partitions(conn)
+    _recover(partitions)
+
+    rows = items_published_before(conn, cutoff)
+    if not rows:
+        logger.info("Nothing older than %d days to archive", days)
+        return 0
+    sources = get_item_sources(conn, [r[0] for r in rows])
+    by_month: dict[str, list[dict]] = {}
+    for r in rows:
+        record = dict(zip(_FIELDS, r))
+        record["sources"] = sources.get(r[0], [])
+        by_month.setdefault(month_of(r[7]), []).append(record)
+
+    updated = {}
+    with metrics.timer("archive_write_seconds"):
+        for month, records in sorted(by_month.items()):
+            records.sort(key=lambda rec: (rec["published_ts"], rec["id"]))
+            length = _append(partition_path(month), records)
+            _bytes, count, max_ts = partitions.get(month, (0, 0, None))
+            newest = records[-1]["published_ts"]
+            updated[month] = (length, count + len(records), newest if max_ts is None else max(max_ts, newest))
+    keys = [(r[8], r[0], month_of(r[7])) for r in rows]
+    save_archived(conn, [r[0] for r in rows], updated, keys)
+    metrics.inc("archive_items_total", len(rows))
+    logger.info("Archived %d items older than %d days into %d partition(s)", len(rows), days, len(updated))
+    return len(rows)
+
+
+def compact(conn):
+    """VACUUM and ANALYZE the DB, then re-sync what depends on rowids or row numbers."""
+    with metrics.timer("archive_compact_seconds"):
+        conn.commit()
+        conn.execute("VACUUM")
+        # VACUUM may renumber the implicit rowids items_fts is keyed by
+        rebuild_search_index(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+        # Fold the WAL into the main file: only items.sqlite itself is committed
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def compact_vectors(conn):
+    """Rewrite the ranking vectors file once enough of its rows belong to archived items."""
+    from rank import compact as compact_rank_vectors
+
+    compact_rank_vectors(conn)
+
+
+def read_partition(month: str):
+    """Yield the archived items of ``month`` as dicts, oldest first."""
+    path = partition_path(month)
+    if not path.exists():
+        return
+    # gzip reads the concatenated members of an append-only file as one stream
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            yield json.loads(line)
+
+
+def index_archived_keys(conn):
+    """Fill ``archived_keys`` from the committed partitions.
+
+    Keys are recomputed from each record's URL, so partitions written under older key
+    rules are indexed under the current ones.
+    """
+    from dedup import canonical_key
+
+    keys = [
+        (canonical_key(rec["url"], rec["id"]), rec["id"], month)
+        for month in sorted(get_archive_partitions(conn))
+        for rec in read_partition(month)
+    ]
+    add_archived_keys(conn, keys)
+    if keys:
+        logger.info("Indexed %d archived canonical keys", len(keys))
+
+
+def _cold_db(months) -> sqlite3.Connection:
+    """An in-memory DB with the items of ``months``, searchable like the hot DB."""
+    mem = sqlite3.connect(":memory:")
+    mem.executescript(SCHEMA)
+    for month in months:
+        restore_items(mem, read_partition(month))
+    # One bulk index build is much cheaper than the per-row triggers
+    mem.executescript(SEARCH_SCHEMA)
+    rebuild_search_index(mem)
+    return mem
+
+
+def search_months(months, topics=None, since=None, limit: int | None = None, unsummarized: bool = False):
+    """``store.search_items`` over the cold partitions of ``months`` only."""
+    months = list(months)
+    if not months:
+        return []
+    with metrics.timer("archive_read_seconds"):
+        mem = _cold_db(months)
+        rows = search_items(mem, topics, since=since, limit=limit, unsummarized=unsummarized)
+        mem.close()
+    metrics.inc("archive_partitions_read_total", len(months))
+    return rows
+
+
+def search(conn, topics=None, since=None, limit: int | None = None, unsummarized: bool = False):
+    """``store.search_items`` over the hot DB plus any cold partitions the query reaches.
+
+    Partitions are only read when ``since`` is older than the newest archived item and the
+    hot DB alone cannot fill ``limit`` with newer rows.
+    """
+    hot = search_items(conn, topics, since=since, limit=limit, unsummarized=unsummarized)
+    partitions = get_archive_partitions(conn)
+    if not partitions:
+        return hot
+    boundary = max(p[2] for p in partitions.values() if p[2] is not None)
+    since_ts = to_epoch(since) if since is not None else None
+    if since_ts is not None and since_ts > boundary:
+        return hot
+    if limit is not None and len(hot) >= limit and (hot[-1][7] or 0) > boundary:
+        return hot
+
+    first = month_of(since_ts) if since_ts is not None else ""
+    months = sorted(m for m in partitions if m >= first)
+    cold = search_months(months, topics, since=since, limit=limit, unsummarized=unsummarized)
+    seen = {r[0] for r in hot}
+    rows = hot + [r for r in cold if r[0] not in seen]
+    # Newest first with undated items last, as ORDER BY published_ts DESC does
+    rows.sort(key=lambda r: (r[7] is not None, r[7] or 0), reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+def main(conn=None):
+    logging.basicConfig(level=logging.INFO)
+    conn = conn or connect()
+    moved = archive_old(conn)
+    if moved:
+        compact_vectors(conn)
+    compact(conn)
+    db = conn.execute("PRAGMA database_list").fetchone()[2]
+    if db:
+        logger.info("%s is %.1f MB after compaction", db, Path(db).stat().st_size / 1e6)
+
+
+if __name__ == "__main__":
+    metrics.run(main)
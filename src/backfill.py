@@ -0,0 +1,290 @@
+"""Page through the arXiv API to fill in history that the weekly collect never saw.
+
+Collect only reads the newest page of each feed. A new topic therefore starts with an
+empty history, and papers from a skipped week are lost. ``backfill`` pages every arXiv
+source in ``feeds.yaml`` through a window of days instead. The window is split into
+slices of BACKFILL_SLICE_DAYS, queried newest first with a ``submittedDate`` range.
+Each slice is paged with ``start=`` and ``max_results=BACKFILL_PAGE``. Short date
+slices keep every query well under the API's 30000-result limit.
+
+arXiv asks API clients for one request every three seconds over a single connection,
+so pages are fetched strictly one after another, paced by ARXIV_DELAY. A fetch thread
+downloads the next page while this thread parses, dedupes and stores the previous one.
+The network delay and the processing time overlap, so a run takes about
+ARXIV_DELAY per page.
+
+Each page is committed together with the source's next position in ``backfill_cursor``.
+Running the same window again resumes where an interrupted run stopped. Without
+``--until`` the window ends today, so a rerun on a later day keeps the unfinished
+window of the same ``--since``, or of the same number of ``--days``.
+
+    python src/ai_digest.py backfill --days 365
+    python src/ai_digest.py backfill --since 2025-01-01 --until 2025-06-30 --source "arXiv cs.AI"
+"""
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+import metrics
+from collect import _DONE, _put, feed_items, make_session, parse_feed
+from config import feeds_path, load_config
+from dedup import dedupe
+from ratelimit import TokenBucket
+from store import get_backfill_cursors, save_backfill_page
+
+logger = logging.getLogger(__name__)
+
+_TOTAL_RE = re.compile(rb"<opensearch:totalResults[^>]*>\s*(\d+)\s*<")
+_ENTRY_RE = re.compile(rb"<entry[\s>]")
+
+
+def _day(value: str) -> date:
+    return datetime.strptime(value, "%Y%m%d").date()
+
+
+def _stamp(day: date) -> str:
+    return day.strftime("%Y%m%d")
+
+
+def page_url(source: dict, cursor: dict, slice_days: int, page_size: int) -> tuple[str, dict]:
+    """The API endpoint and query parameters for the page ``cursor`` points at."""
+    parts = urlsplit(source["url"])
+    query = parse_qs(parts.query).get("search_query", ["all:*"])[0]
+    since, end = _day(cursor["since"]), _day(cursor["slice_end"])
+    lo = max(since, end - timedelta(days=slice_days - 1))
+    params = {
+        "search_query": f"({query}) AND submittedDate:[{_stamp(lo)}0000 TO {_stamp(end)}2359]",
+        "sortBy": "submittedDate",
+        "sortOrder": "descending",
+        "start": cursor["start"],
+        "max_results": page_size,
+    }
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")), params
+
+
+def advance(cursor: dict, got: int, total: int, slice_days: int) -> dict:
+    """The cursor after a page of ``got`` entries out of a slice of ``total``."""
+    start = cursor["start"] + got
+    if got and start < total:
+        return dict(cursor, start=start)
+    since, end = _day(cursor["since"]), _day(cursor["slice_end"])
+    nxt = end - timedelta(days=slice_days)
+    if nxt < since:
+        return dict(cursor, start=0, done=True)
+    return dict(cursor, slice_end=_stamp(nxt), start=0)
+
+
+def _fetch_pages(plans, session, bucket: TokenBucket, settings: dict, out: queue.Queue, stop: threading.Event):
+    """Download each plan's pages in order and hand them on with the cursor that follows.
+
+    The position of the next page only depends on the result count in the response, so
+    it is read here with a regex and the full parse is left to the consumer.
+    """
+    slice_days, page_size, retries = settings["slice_days"], settings["page_size"], settings["retries"]
+    pages = 0
+    try:
+        for source, cursor in plans:
+            attempts = 0
+            while not cursor["done"] and not stop.is_set():
+                if settings["max_pages"] is not None and pages >= settings["max_pages"]:
+                    return
+                url, params = page_url(source, cursor, slice_days, page_size)
+                metrics.observe("backfill_wait_seconds", bucket.acquire())
+                start = time.perf_counter()
+                try:
+                    resp = session.get(url, params=params, timeout=60)
+                    resp.raise_for_status()
+                    body = resp.content
+                except Exception as ex:
+                    attempts += 1
+                    if attempts > retries:
+                        _put(out, (source, cursor, None, None, ex), stop)
+                        break
+                    logger.warning("%s: page %s failed (%s); retrying", source["name"], params["start"], ex)
+                    metrics.inc("backfill_retries_total", source=source["name"])
+                    continue
+                metrics.observe("backfill_fetch_seconds", time.perf_counter() - start, source=source["name"])
+                pages += 1
+
+                m = _TOTAL_RE.search(body)
+                total = int(m.group(1)) if m else 0
+                got = len(_ENTRY_RE.findall(body))
+                if not got and cursor["start"] < total:
+                    # The API now and then answers a valid offset with an empty page
+                    if attempts < retries:
+                        attempts += 1
+                        logger.warning("%s: empty page at %d of %d; retrying", source["name"], cursor["start"], total)
+                        metrics.inc("backfill_retries_total", source=source["name"])
+                        continue
+                    logger.warning(
+                        "%s: skipping entries %d-%d of the slice ending %s",
+                        source["name"],
+                        cursor["start"],
+                        total,
+                        cursor["slice_end"],
+                    )
+                attempts = 0
+                nxt = advance(cursor, got, total, slice_days)
+                _put(out, (source, nxt, body, (cursor, total), None), stop)
+                cursor = nxt
+    finally:
+        _put(out, _DONE, stop)
+
+
+def _span(cur: dict) -> int:
+    return (_day(cur["until"]) - _day(cur["since"])).days
+
+
+def _resumes(cur: dict, window: dict, open_end: str | None) -> bool:
+    if cur["since"] == window["since"] and cur["until"] == window["until"]:
+        return True
+    if cur["done"] or cur["until"] > window["until"]:
+        return False
+    # The default end moved on since the interrupted run
+    if open_end == "since":
+        return cur["since"] == window["since"]
+    if open_end == "days":
+        return _span(cur) == _span(window)
+    return False
+
+
+def plan_sources(sources, cursors: dict, since: date, until: date, restart: bool = False, open_end: str | None = None):
+    """Pair each source with the cursor it should continue from, skipping finished ones.
+
+    ``open_end`` is set when ``until`` only defaulted to today. An unfinished cursor with
+    the same start (``"since"``) or the same number of days (``"days"``) then resumes
+    with the window it was started with.
+    """
+    window = {"since": _stamp(since), "until": _stamp(until)}
+    plans = []
+    for s in sources:
+        cur = cursors.get(s["name"])
+        if not restart and cur and _resumes(cur, window, open_end):
+            if cur["done"]:
+                logger.info("%s: %s..%s already backfilled", s["name"], cur["since"], cur["until"])
+                continue
+            logger.info("%s: resuming at slice ending %s, offset %d", s["name"], cur["slice_end"], cur["start"])
+            plans.append((s, cur))
+        else:
+            plans.append((s, dict(window, slice_end=window["until"], start=0, items=0, done=False)))
+    return plans
+
+
+def backfill(
+    conn,
+    since: date,
+    until: date,
+    names=None,
+    restart: bool = False,
+    max_pages: int | None = None,
+    open_end: str | None = None,
+) -> int:
+    """Backfill the arXiv sources (or just ``names``) for ``since``..``until``, inclusive.
+
+    Returns the number of new items stored. ``max_pages`` bounds the run; a later run
+    with the same window continues from there. ``open_end`` is set when ``until`` only
+    defaulted to today (see ``plan_sources``).
+    """
+    path = feeds_path()
+    if not path.exists():
+        logger.error("feeds.yaml not found at %s", path)
+        return 0
+    sources = [s for s in load_config(path)["sources"] if s.get("type") == "arxiv"]
+    if names:
+        unknown = set(names) - {s["name"] for s in sources}
+        if unknown:
+            raise ValueError(f"Not an arXiv source in feeds.yaml: {', '.join(sorted(unknown))}")
+        sources = [s for s in sources if s["name"] in names]
+
+    settings = {
+        "slice_days": max(1, int(os.environ.get("BACKFILL_SLICE_DAYS", "7"))),
+        "page_size": max(1, int(os.environ.get("BACKFILL_PAGE", "500"))),
+        "retries": max(0, int(os.environ.get("BACKFILL_MAX_RETRIES", "3"))),
+        "max_pages": max_pages,
+    }
+    delay = float(os.environ.get("ARXIV_DELAY", "3"))
+    depth = max(1, int(os.environ.get("BACKFILL_QUEUE", "2")))
+
+    plans = plan_sources(sources, get_backfill_cursors(conn), since, until, restart, open_end)
+    if not plans:
+        return 0
+    session = make_session(1)
+    bucket = TokenBucket(1 / delay if delay > 0 else float("inf"))
+    pages: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    fetcher = threading.Thread(
+        target=_fetch_pages, args=(plans, session, bucket, settings, pages, stop), name="backfill-fetch", daemon=True
+    )
+
+    stored = {"items": 0, "new": 0, "merged": 0}
+    added = {s["name"]: cur["items"] for s, cur in plans}
+    fetcher.start()
+    try:
+        with session:
+            while True:
+                msg = pages.get()
+                if msg is _DONE:
+                    break
+                source, nxt, body, page, error = msg
+                name = source["name"]
+                if error is not None:
+                    logger.error("%s: giving up at offset %d: %s", name, nxt["start"], error, exc_info=error)
+                    metrics.inc("backfill_failed_total", source=name)
+                    continue
+                feed = parse_feed(source, body)
+                items, _newest = feed_items(source, feed, limit=None)
+                with metrics.timer("collect_dedup_seconds"):
+                    fresh, duplicates = dedupe(conn, items)
+                added[name] += len(fresh)
+                nxt = dict(nxt, items=added[name])
+                save_backfill_page(conn, name, fresh, duplicates, nxt)
+                metrics.inc("backfill_pages_total", source=name)
+                metrics.inc("backfill_items_total", len(items), source=name)
+                stored["items"] += len(items)
+                stored["new"] += len(fresh)
+                stored["merged"] += len(duplicates)
+                cursor, total = page
+                logger.info(
+                    "%s: slice ending %s, entries %d-%d of %d: %d new",
+                    name,
+                    cursor["slice_end"],
+                    cursor["start"],
+                    cursor["start"] + len(items),
+                    total,
+                    len(fresh),
+                )
+                if nxt["done"]:
+                    logger.info("%s: backfill of %s..%s complete", name, nxt["since"], nxt["until"])
+    finally:
+        stop.set()
+        fetcher.join(timeout=5)
+
+    logger.info(
+        "Backfilled %d entries (%d new, %d merged into known papers)", stored["items"], stored["new"], stored["merged"]
+    )
+    return stored["new"]
+
+
+def window(days: int | None = None, since: str | None = None, until: str | None = None) -> tuple[date, date]:
+    """The inclusive UTC day range for the ``--days`` / ``--since`` / ``--until`` options."""
+    end = date.fromisoformat(until) if until else datetime.now(timezone.utc).date()
+    if since:
+        start = date.fromisoformat(since)
+    else:
+        start = end - timedelta(days=(days or 30) - 1)
+    if start > end:
+        raise ValueError(f"--since {start} is after --until {end}")
+    return start, end
+
+
+if __name__ == "__main__":
+    import sys
+
+    import ai_digest
+
+    ai_digest.main(["backfill", *sys.argv[1:]])
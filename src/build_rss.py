@@ -1,11 +1,18 @@
+import hashlib
+import json
 import logging
+import os
+import re
+import tempfile
 from pathlib import Path
-from store import connect
+from config import topics
+from store import connect, get_fragments, search_items, set_fragments
 from datetime import datetime, timezone
 from email.utils import format_datetime
-from dateutil import parser as dtparser
 from xml.sax.saxutils import escape as xml_escape
-from summarize import digest_summary
+from summarize import week_overview
+from llm import log_cache_stats
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +27,16 @@ def esc(x: str) -> str:
     return xml_escape(str(x), entities={"'": "&apos;", '"': "&quot;"})
 
 
-def to_rfc822(dt_str: str) -> str:
-    # Convert stored dates (ISO or whatever) into RFC-822 for RSS readers.
+def to_rfc822(dt_str: str, ts: int | None = None) -> str:
+    # Convert stored dates into RFC-822 for RSS readers. The epoch column is the fast path;
+    # free-form strings from rows without one still go through dateutil.
+    if ts is not None:
+        return format_datetime(datetime.fromtimestamp(ts, timezone.utc))
     if not dt_str:
         return format_datetime(datetime.now(timezone.utc))
     try:
+        from dateutil import parser as dtparser
+
         dt = dtparser.parse(dt_str)
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=timezone.utc)
@@ -33,65 +45,149 @@ def to_rfc822(dt_str: str) -> str:
         return format_datetime(datetime.now(timezone.utc))
 
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-    conn = connect()
-    rows = conn.cursor().execute(
-        "SELECT source, title, url, published, summary, ai_summary FROM items ORDER BY published DESC LIMIT 50"
-    ).fetchall()
-
-    now_rfc822 = format_datetime(datetime.now(timezone.utc))
-
-    items_xml = []
-    # Build an overall AI summary for the feed based on ai_summary or item summaries
-    combined_texts = [r[5] for r in rows if len(r) > 5 and r[5]]
-    if not combined_texts:
-        combined_texts = [r[4] for r in rows if len(r) > 4 and r[4]]
-    overall = digest_summary(combined_texts)
-    if overall:
-        # Include a top-level synthetic item summarizing the digest
-        items_xml.append("""
+ITEM_TEMPLATE = """
 <item>
-  <title>AI Digest — Daily Summary</title>
+  <title>%s</title>
   <link>%s</link>
-  <guid>%s#summary</guid>
+  <guid>%s</guid>
   <pubDate>%s</pubDate>
   <description>%s</description>
 </item>
-""" % (esc(FEED_URL), esc(FEED_URL), esc(now_rfc822), esc(overall)))
-    for source, title, url, published, summary, ai_summary in rows:
-        pub_rfc822 = to_rfc822(published)
-        combined = f"{source} - {(summary or '')[:400]}"
-        if ai_summary:
-            combined = combined + "\n\nAI summary: " + (ai_summary or "")
-        items_xml.append("""
+"""
+
+SUMMARY_TEMPLATE = """
 <item>
-  <title>%s</title>
+  <title>AI Digest — Daily Summary</title>
   <link>%s</link>
-  <guid>%s</guid>
+  <guid>%s#summary</guid>
   <pubDate>%s</pubDate>
   <description>%s</description>
 </item>
-""" % (esc(title), esc(url), esc(url), esc(pub_rfc822), esc(combined)))
+"""
+
+_LAST_BUILD_RE = re.compile(r"<lastBuildDate>[^<]*</lastBuildDate>")
+
 
-    rss = f"""<?xml version="1.0" encoding="UTF-8"?>
+def item_hash(row) -> str:
+    # Everything render_item reads; a change to any field invalidates the cached fragment
+    raw = json.dumps(row[1:], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def render_item(row) -> str:
+    _id, source, title, url, published, summary, ai_summary, published_ts = row
+    pub_rfc822 = to_rfc822(published, published_ts)
+    combined = f"{source} - {(summary or '')[:400]}"
+    if ai_summary:
+        combined = combined + "\n\nAI summary: " + (ai_summary or "")
+    return ITEM_TEMPLATE % (esc(title), esc(url), esc(url), esc(pub_rfc822), esc(combined))
+
+
+def item_fragments(conn, rows) -> list[str]:
+    """Rendered <item> fragments for ``rows``; only new or changed items are re-rendered."""
+    cached = get_fragments(conn, "rss")
+    fragments = []
+    fresh = []
+    for row in rows:
+        digest = item_hash(row)
+        hit = cached.get(row[0])
+        if hit and hit[0] == digest:
+            fragments.append(hit[1])
+            continue
+        fragment = render_item(row)
+        fragments.append(fragment)
+        fresh.append((row[0], digest, fragment))
+    set_fragments(conn, "rss", fresh, keep_ids=[r[0] for r in rows])
+    logger.info("Rendered %d/%d RSS items (%d cached)", len(fresh), len(rows), len(rows) - len(fresh))
+    return fragments
+
+
+def write_if_changed(out_path: Path, chunks: list[str], volatile: str) -> bool:
+    """Stream ``chunks`` to a temp file and atomically move it over ``out_path``.
+
+    ``volatile`` is the one chunk (the <lastBuildDate> element) that is ignored when
+    deciding whether anything changed. If the rest is byte-identical to the current
+    file, the temp file is discarded and ``out_path`` is left untouched.
+    """
+    new_digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{out_path.name}.", dir=out_path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                if chunk is not volatile:
+                    new_digest.update(chunk.encode("utf-8"))
+        if out_path.exists():
+            old = _LAST_BUILD_RE.sub("", out_path.read_text(encoding="utf-8"), count=1)
+            if hashlib.sha256(old.encode("utf-8")).digest() == new_digest.digest():
+                os.unlink(tmp_name)
+                return False
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, out_path)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def main(conn=None, overall: str | None = None):
+    """Write rss.xml. ``overall`` reuses a digest overview computed by the caller.
+
+    Without one, ``summarize.week_overview`` builds it; an empty string means no overview.
+    """
+    logging.basicConfig(level=logging.INFO)
+    conn = conn or connect()
+    # Rank the newest on-topic candidates by relevance plus recency and keep the best 50
+    from rank import rank
+
+    candidates = int(os.environ.get("RANK_CANDIDATES", "500"))
+    rows = rank(conn, search_items(conn, topics(), limit=candidates), limit=50)
+
+    now_rfc822 = format_datetime(datetime.now(timezone.utc))
+
+    items_xml = []
+    # The same overview of the week the email carries, whichever entry point runs
+    if overall is None:
+        overall = week_overview(conn)
+    if overall:
+        # Include a top-level synthetic item summarizing the digest. It is dated with the
+        # newest item rather than the build time so an unchanged feed renders identically.
+        newest = max(rows, key=lambda r: r[7] or 0) if rows else None
+        summary_date = to_rfc822(newest[4], newest[7]) if newest else now_rfc822
+        items_xml.append(SUMMARY_TEMPLATE % (esc(FEED_URL), esc(FEED_URL), esc(summary_date), esc(overall)))
+    with metrics.timer("render_seconds", output="rss"):
+        items_xml.extend(item_fragments(conn, rows))
+
+    last_build = f"<lastBuildDate>{esc(now_rfc822)}</lastBuildDate>"
+    chunks = [
+        f"""<?xml version="1.0" encoding="UTF-8"?>
 <rss version="2.0">
 <channel>
   <title>AI Research Digest</title>
   <link>{esc(SITE_URL)}</link>
   <description>Curated AI research + releases</description>
-  <lastBuildDate>{esc(now_rfc822)}</lastBuildDate>
+  """,
+        last_build,
+        f"""
   <atom:link href="{esc(FEED_URL)}" rel="self" type="application/rss+xml" xmlns:atom="http://www.w3.org/2005/Atom"/>
-  {''.join(items_xml)}
+  """,
+        *items_xml,
+        """
 </channel>
 </rss>
-"""
+""",
+    ]
     base = Path(__file__).resolve().parent.parent
-    out_path = base / "rss.xml"
-    with open(out_path, "w", encoding="utf-8") as fh:
-        fh.write(rss)
-    logger.info("Wrote %s", out_path)
+    out_path = Path(os.environ.get("RSS_PATH", str(base / "rss.xml")))
+    with metrics.timer("write_seconds", output="rss"):
+        changed = write_if_changed(out_path, chunks, last_build)
+    if changed:
+        logger.info("Wrote %s", out_path)
+    else:
+        logger.info("%s unchanged apart from lastBuildDate; left as is", out_path)
+    log_cache_stats()
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
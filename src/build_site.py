@@ -0,0 +1,438 @@
+"""Static archive site: weekly HTML pages, JSON Feed, Atom feed and a search index.
+
+Every on-topic item is grouped by ISO week of ``published_ts``. A week page is
+re-rendered only when the hash of its rows (plus its neighbour links) differs from the
+one recorded in ``.manifest.json`` by the previous build. The paginated index, the
+feeds and the search index are cheap to render. They are only written, and
+recompressed, when their bytes change. The search entries of unchanged weeks are taken
+from the previous build's search.json, so none of them are kept in the DB. Each written
+file gets a ``.gz`` sibling, and a ``.br`` one when the ``brotli`` package is installed,
+so a static host can serve them precompressed.
+
+Items pruned from the DB are read from the archive partitions. The manifest keeps each
+partition's committed length with the row count and hash of each of its weeks, so only
+partitions that grew since the last build are decompressed. An unchanged one is read
+only when a week it contributes to has to be re-rendered anyway.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+from html import escape as html_escape
+from pathlib import Path
+
+import archive
+import metrics
+from build_rss import SITE_URL, esc
+from config import topics
+from extractive import STOPWORDS
+from store import connect, get_archive_partitions, search_items
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SITE_TITLE = "AI Research Digest"
+WEEKS_PER_PAGE = 26
+FEED_ITEMS = 50
+# Files above this size are compressed at a faster level
+COMPRESS_MAX_BYTES = 1 << 20
+# Abstract characters indexed for items without an AI summary
+SEARCH_TEXT_CHARS = 300
+_TERM_RE = re.compile(r"[a-z0-9][a-z0-9-]*")
+MANIFEST = ".manifest.json"
+# Bump to force a full rebuild when templates change
+TEMPLATE_VERSION = 1
+
+
+def site_dir() -> Path:
+    default = Path(__file__).resolve().parent.parent / "site"
+    return Path(os.environ.get("SITE_DIR", str(default)))
+
+
+def site_url() -> str:
+    return os.environ.get("SITE_BASE_URL", SITE_URL.rstrip("/") + "/site/")
+
+
+def week_of(ts: int) -> str:
+    year, week, _ = datetime.fromtimestamp(ts, timezone.utc).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _index_name(page: int) -> str:
+    return "index.html" if page == 1 else f"page/{page}.html"
+
+
+PAGE_TEMPLATE = """<!doctype html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>%(title)s</title>
+<link rel="alternate" type="application/atom+xml" title="%(site)s" href="%(root)satom.xml">
+<link rel="alternate" type="application/feed+json" title="%(site)s" href="%(root)sfeed.json">
+<style>body{max-width:46rem;margin:2rem auto;padding:0 1rem;font:16px/1.5 system-ui,sans-serif}
+li{margin-bottom:1rem}small{color:#666}nav{margin:2rem 0}</style>
+</head>
+<body>
+<h1><a href="%(root)sindex.html">%(site)s</a></h1>
+%(body)s
+</body>
+</html>
+"""
+
+SEARCH_SNIPPET = """<input id="q" type="search" placeholder="Search the archive" size="40">
+<ol id="hits"></ol>
+<script>
+let docs;
+document.getElementById("q").addEventListener("input", async (e) => {
+  docs = docs || await (await fetch("%(root)ssearch.json")).json();
+  const terms = e.target.value.toLowerCase().split(/\\s+/).filter(Boolean);
+  const hits = terms.length ? docs.filter(d => terms.every(t => d.text.includes(t))).slice(0, 50) : [];
+  document.getElementById("hits").innerHTML = hits.map(d =>
+    `<li><a href="${d.url}">${d.title}</a> <small>${d.week}</small></li>`).join("");
+});
+</script>
+"""
+
+
+def _page(title: str, body: str, root: str) -> str:
+    return PAGE_TEMPLATE % {"title": html_escape(title), "site": SITE_TITLE, "root": root, "body": body}
+
+
+def render_week(week: str, rows, prev_week: str | None, next_week: str | None) -> str:
+    parts = [f"<h2>Week {html_escape(week)}</h2>", f"<p>{len(rows)} items</p>", "<ol>"]
+    for _id, source, title, url, published, summary, ai_summary, _ts in rows:
+        parts.append(
+            f"<li><a href='{html_escape(url or '', quote=True)}'>{html_escape(title or '')}</a>"
+            f"<br/><small>{html_escape(source or '')} · {html_escape((published or '')[:10])}</small>"
+            f"<br/>{html_escape(ai_summary or (summary or '')[:400])}</li>"
+        )
+    parts.append("</ol><nav>")
+    if next_week:
+        parts.append(f"<a href='{next_week}.html'>&larr; {next_week}</a> ")
+    if prev_week:
+        parts.append(f"<a href='{prev_week}.html'>{prev_week} &rarr;</a>")
+    parts.append("</nav>")
+    return _page(f"{SITE_TITLE} — {week}", "\n".join(parts), "../")
+
+
+def render_index(page: int, pages: int, weeks: list[tuple[str, int]]) -> str:
+    root = "" if page == 1 else "../"
+    parts = [SEARCH_SNIPPET % {"root": root}] if page == 1 else []
+    parts.append("<ul>")
+    for week, count in weeks:
+        parts.append(f"<li><a href='{root}weeks/{week}.html'>{week}</a> <small>{count} items</small></li>")
+    parts.append("</ul><nav>")
+    if page > 1:
+        parts.append(f"<a href='{root}{_index_name(page - 1)}'>&larr; newer</a> ")
+    if page < pages:
+        parts.append(f"<a href='{root}{_index_name(page + 1)}'>older &rarr;</a>")
+    parts.append("</nav>")
+    return _page(SITE_TITLE if page == 1 else f"{SITE_TITLE} — page {page}", "\n".join(parts), root)
+
+
+def render_json_feed(rows) -> str:
+    base = site_url()
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": SITE_TITLE,
+        "home_page_url": base,
+        "feed_url": base + "feed.json",
+        "items": [
+            {
+                "id": r[0],
+                "url": r[3],
+                "title": r[2],
+                "content_text": r[6] or r[5] or "",
+                "summary": (r[5] or "")[:400],
+                "date_published": _iso(r[7]),
+                "tags": [s for s in (r[1] or "").split(", ") if s],
+            }
+            for r in rows
+        ],
+    }
+    return json.dumps(feed, ensure_ascii=False, indent=1)
+
+
+def render_atom(rows) -> str:
+    base = site_url()
+    updated = _iso(max(r[7] for r in rows)) if rows else _iso(0)
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        f"<title>{SITE_TITLE}</title>",
+        f"<id>{esc(base)}</id>",
+        f'<link href="{esc(base)}"/>',
+        f'<link rel="self" href="{esc(base)}atom.xml"/>',
+        f"<updated>{updated}</updated>",
+    ]
+    for _id, source, title, url, _published, summary, ai_summary, ts in rows:
+        parts.append(
+            f"<entry><id>urn:ai-digest:{esc(_id)}</id><title>{esc(title)}</title>"
+            f'<link href="{esc(url)}"/><updated>{_iso(ts)}</updated>'
+            f"<author><name>{esc(source)}</name></author>"
+            f"<summary>{esc(ai_summary or (summary or '')[:400])}</summary></entry>"
+        )
+    parts.append("</feed>\n")
+    return "\n".join(parts)
+
+
+def _terms(text: str) -> str:
+    return " ".join(dict.fromkeys(t for t in _TERM_RE.findall(text.lower()) if t not in STOPWORDS))
+
+
+def search_docs(rows) -> str:
+    """Search index entries for ``rows``, as comma-joined JSON objects."""
+    # ``text`` holds the distinct terms of the title and short summary, so the page can
+    # match prefixes with a substring test and the index stays a fraction of the archive
+    return ",".join(
+        json.dumps(
+            {
+                "title": html_escape(r[2] or ""),
+                "url": html_escape(r[3] or "", quote=True),
+                "week": week_of(r[7]),
+                "text": _terms(f"{r[2] or ''} {r[6] or (r[5] or '')[:SEARCH_TEXT_CHARS]}"),
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        for r in rows
+    )
+
+
+def previous_search_docs(out: Path, old_files: dict[str, str]) -> dict[str, str]:
+    """Each week's ``search_docs`` from the last build's search.json, if the file is intact."""
+    try:
+        text = (out / "search.json").read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    if hashlib.sha256(text.encode("utf-8")).hexdigest() != old_files.get("search.json"):
+        return {}
+    by_week: dict[str, list[str]] = {}
+    for doc in json.loads(text):
+        by_week.setdefault(doc["week"], []).append(json.dumps(doc, ensure_ascii=False, separators=(",", ":")))
+    return {week: ",".join(entries) for week, entries in by_week.items()}
+
+
+def _rows_digest(rows) -> str:
+    # repr of the row tuples is stable and much cheaper than item_hash per row
+    return hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()
+
+
+class ColdWeeks:
+    """On-topic rows of the archive partitions, decompressed only for the months needed.
+
+    ``weeks`` maps each month to ``{week: [count, digest]}`` of its rows. A month whose
+    committed length and topic filter are the same as in the ``previous`` build's
+    manifest entry reuses that summary and stays compressed until ``rows`` asks for it.
+    """
+
+    def __init__(self, topic_filter, partitions, previous: dict, skip_ids=()):
+        self.topics = topic_filter
+        self.key = hashlib.sha256(json.dumps(topic_filter, sort_keys=True).encode("utf-8")).hexdigest()
+        self.bytes = {month: info[0] for month, info in partitions.items()}
+        self.max_ts = {month: info[2] or 0 for month, info in partitions.items()}
+        self.skip_ids = set(skip_ids)
+        self.loaded: dict[str, list] = {}
+        self.weeks: dict[str, dict[str, list]] = {}
+        if previous.get("topics") == self.key:
+            for month, info in previous.get("months", {}).items():
+                if self.bytes.get(month) == info.get("bytes"):
+                    self.weeks[month] = info["weeks"]
+        self.load([m for m in self.bytes if m not in self.weeks])
+
+    def load(self, months):
+        months = sorted(m for m in months if m not in self.loaded)
+        if not months:
+            return
+        for month in months:
+            self.loaded[month] = []
+        for r in archive.search_months(months, self.topics):
+            # Legacy copies still in the hot DB win, as in archive.search
+            if r[7] is not None and r[0] not in self.skip_ids:
+                self.loaded[archive.month_of(r[7])].append(r)
+        for month in months:
+            by_week: dict[str, list] = {}
+            for r in self.loaded[month]:
+                by_week.setdefault(week_of(r[7]), []).append(r)
+            self.weeks[month] = {w: [len(rows), _rows_digest(rows)] for w, rows in by_week.items()}
+
+    def months_of(self, week: str) -> list[str]:
+        return sorted((m for m, weeks in self.weeks.items() if week in weeks), reverse=True)
+
+    def all_weeks(self) -> set[str]:
+        return {w for weeks in self.weeks.values() for w in weeks}
+
+    def count(self, week: str) -> int:
+        return sum(self.weeks[m][week][0] for m in self.months_of(week))
+
+    def digests(self, week: str) -> list[str]:
+        return [self.weeks[m][week][1] for m in self.months_of(week)]
+
+    def rows(self, week: str) -> list:
+        """The week's cold rows, newest first."""
+        months = self.months_of(week)
+        self.load(months)
+        return [r for m in months for r in self.loaded[m] if week_of(r[7]) == week]
+
+    def newest(self, hot, limit: int) -> list:
+        """The ``limit`` newest rows of ``hot`` and the archive together."""
+        rows = list(hot)
+        for month in sorted(self.bytes, reverse=True):
+            rows.sort(key=lambda r: r[7], reverse=True)
+            if len(rows) >= limit and rows[limit - 1][7] >= self.max_ts[month]:
+                break
+            self.load([month])
+            rows.extend(self.loaded[month])
+        rows.sort(key=lambda r: r[7], reverse=True)
+        return rows[:limit]
+
+    def manifest(self) -> dict:
+        return {
+            "topics": self.key,
+            "months": {m: {"bytes": self.bytes[m], "weeks": self.weeks[m]} for m in sorted(self.bytes)},
+        }
+
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def write_compressed(path: Path, text: str):
+    """Write ``path`` plus its precompressed ``.gz`` (and ``.br``) variants."""
+    data = text.encode("utf-8")
+    _atomic_write(path, data)
+    # Maximum compression costs seconds per MB with brotli; large files get a cheaper level
+    big = len(data) > COMPRESS_MAX_BYTES
+    with metrics.timer("site_compress_seconds"):
+        # mtime=0 keeps the gzip bytes identical for identical input
+        _atomic_write(path.with_name(path.name + ".gz"), gzip.compress(data, 6 if big else 9, mtime=0))
+        if brotli is not None:
+            _atomic_write(path.with_name(path.name + ".br"), brotli.compress(data, quality=5 if big else 11))
+    metrics.inc("site_files_written_total")
+
+
+def _remove(path: Path):
+    for p in (path, path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")):
+        if p.exists():
+            p.unlink()
+
+
+def main(conn=None):
+    """Build the archive site under SITE_DIR (default ``site/``), re-rendering only what changed."""
+    logging.basicConfig(level=logging.INFO)
+    conn = conn or connect()
+    out = site_dir()
+    manifest_path = out / MANIFEST
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("template") != TEMPLATE_VERSION or manifest.get("brotli") != (brotli is not None):
+        manifest = {}
+    old_files: dict[str, str] = manifest.get("files", {})
+    old_weeks: dict[str, str] = manifest.get("weeks", {})
+    files: dict[str, str] = {}
+    weeks_hash: dict[str, str] = {}
+    written = 0
+
+    def emit(rel: str, text: str):
+        nonlocal written
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        files[rel] = digest
+        if old_files.get(rel) != digest or not (out / rel).exists():
+            write_compressed(out / rel, text)
+            written += 1
+
+    topic_filter = topics()
+    with metrics.timer("db_read_seconds", op="site"):
+        hot = [r for r in search_items(conn, topic_filter) if r[7] is not None]
+        # The archive covers the whole history, so pruned items are read from cold storage
+        cold = ColdWeeks(topic_filter, get_archive_partitions(conn), manifest.get("cold") or {}, [r[0] for r in hot])
+    hot_weeks: dict[str, list] = {}
+    for r in hot:
+        hot_weeks.setdefault(week_of(r[7]), []).append(r)
+    weeks = sorted(set(hot_weeks) | cold.all_weeks(), reverse=True)
+    counts = {w: len(hot_weeks.get(w, ())) + cold.count(w) for w in weeks}
+
+    def week_rows(week: str) -> list:
+        rows = hot_weeks.get(week, []) + cold.rows(week)
+        rows.sort(key=lambda r: r[7], reverse=True)
+        return rows
+
+    with metrics.timer("render_seconds", output="site"):
+        for i, week in enumerate(weeks):
+            newer = weeks[i - 1] if i > 0 else None
+            older = weeks[i + 1] if i + 1 < len(weeks) else None
+            key = f"{newer}|{older}|{_rows_digest(hot_weeks.get(week, []))}|{cold.digests(week)}"
+            weeks_hash[week] = hashlib.sha256(key.encode("utf-8")).hexdigest()
+            rel = f"weeks/{week}.html"
+            if old_weeks.get(week) == weeks_hash[week] and rel in old_files and (out / rel).exists():
+                files[rel] = old_files[rel]
+                continue
+            emit(rel, render_week(week, week_rows(week), older, newer))
+        rebuilt = sum(1 for w in weeks if old_weeks.get(w) != weeks_hash[w])
+
+        # Unchanged weeks keep their entries from the last build's search.json
+        previous = previous_search_docs(out, old_files)
+        docs = {
+            w: previous[w] if old_weeks.get(w) == weeks_hash[w] and w in previous else search_docs(week_rows(w))
+            for w in weeks
+        }
+
+        pages = max(1, -(-len(weeks) // WEEKS_PER_PAGE))
+        for page in range(1, pages + 1):
+            chunk = weeks[(page - 1) * WEEKS_PER_PAGE : page * WEEKS_PER_PAGE]
+            emit(_index_name(page), render_index(page, pages, [(w, counts[w]) for w in chunk]))
+        newest = cold.newest(hot, FEED_ITEMS)
+        emit("feed.json", render_json_feed(newest))
+        emit("atom.xml", render_atom(newest))
+        emit("search.json", "[" + ",".join(docs[w] for w in weeks if docs[w]) + "]")
+
+    for rel in set(old_files) - set(files):
+        _remove(out / rel)
+    manifest = {
+        "template": TEMPLATE_VERSION,
+        "brotli": brotli is not None,
+        "weeks": weeks_hash,
+        "files": files,
+        "cold": cold.manifest(),
+    }
+    out.mkdir(parents=True, exist_ok=True)
+    _atomic_write(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    logger.info(
+        "Site: %d weeks (%d re-rendered, %d/%d archive months read), %d/%d files written to %s",
+        len(weeks),
+        rebuilt,
+        len(cold.loaded),
+        len(cold.bytes),
+        written,
+        len(files),
+        out,
+    )
+
+
+if __name__ == "__main__":
+    metrics.run(main)
@@ -1,108 +1,370 @@
 import logging
-from pathlib import Path
-import yaml
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
 import hashlib
 import feedparser
 import requests
+from requests.adapters import HTTPAdapter
 from dateutil import parser as dtparser
-from store import connect, upsert_items
+import metrics
+from config import feeds_path, load_config
+from dedup import dedupe
+from store import connect, get_feed_cache, get_source_cursors, save_collected
 
 logger = logging.getLogger(__name__)
 
-KEYWORDS = [
-    "productivity",
-    "workflow",
-    "copilot",
-    "assistant",
-    "agent",
-    "automation",
-    "human-ai",
-    "human ai",
-    "decision support",
-    "knowledge work",
-    "office",
-    "programming assistant",
-    "software engineering",
-    "developer productivity",
-    "task completion",
-    "information retrieval",
-    "search assistant",
-    "writing",
-    "coding",
-    "debugging",
-]
-
-def is_productivity_paper(title: str, summary: str) -> bool:
-    text = f"{title} {summary}".lower()
-    return any(k in text for k in KEYWORDS)
+USER_AGENT = "Mozilla/5.0 (compatible; ai-digest/1.0)"
+
+# Feed-level timestamps that change on every request even when no entry did
+_VOLATILE_HEADER_RE = re.compile(rb"<(updated|lastBuildDate)>[^<]*</\1>")
+
 
 def stable_id(source, url, title):
     raw = f"{source}|{url}|{title}".encode("utf-8")
     return hashlib.sha256(raw).hexdigest()
 
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-    # Resolve feeds.yaml relative to the project root so scripts can be run from any cwd.
-    base = Path(__file__).resolve().parent.parent
-    feeds_path = base / "feeds.yaml"
-    if not feeds_path.exists():
-        logger.error("feeds.yaml not found at %s", feeds_path)
-        return
+class HostLimiter:
+    """Caps the number of in-flight requests per host (arXiv asks for polite clients)."""
+
+    def __init__(self, per_host: int):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+
+    def slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._slots.get(host)
+            if sem is None:
+                sem = self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Shared session so keep-alive connections are reused across sources on the same host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def content_digest(body: bytes) -> str:
+    """Hash a feed body, ignoring the volatile channel header (arXiv stamps <updated> per request)."""
+    cut = len(body)
+    for marker in (b"<entry", b"<item"):
+        idx = body.find(marker)
+        if idx != -1:
+            cut = min(cut, idx)
+    head = _VOLATILE_HEADER_RE.sub(b"", body[:cut])
+    return hashlib.sha256(head + body[cut:]).hexdigest()
+
+
+class FeedTooLarge(Exception):
+    """A response body exceeded COLLECT_MAX_BYTES."""
+
+
+def _read_capped(resp, max_bytes: int) -> bytes:
+    declared = resp.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise FeedTooLarge(f"Content-Length {declared} exceeds {max_bytes} bytes")
+    body = bytearray()
+    for chunk in resp.iter_content(65536):
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise FeedTooLarge(f"body exceeds {max_bytes} bytes")
+    return bytes(body)
+
+
+def fetch_feed(
+    session: requests.Session,
+    limiter: HostLimiter,
+    source: dict,
+    cached: dict | None = None,
+    max_bytes: int = 20 * 1024 * 1024,
+) -> dict:
+    """Download one source, reusing the validators from the previous run.
+
+    The body is streamed and abandoned once it grows past ``max_bytes``. Returns a dict
+    with ``status`` ("not_modified", "unchanged" or "fetched"), the raw ``body`` (only
+    when fetched) and the ``cache`` entry to persist for the next run.
+    """
+    if cached and cached.get("url") != source["url"]:
+        cached = None
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    name = source["name"]
+    with limiter.slot(source["url"]):
+        start = time.perf_counter()
+        with session.get(source["url"], headers=headers, timeout=30, stream=True) as resp:
+            if resp.status_code == 304 and cached:
+                metrics.observe("collect_fetch_seconds", time.perf_counter() - start, source=name)
+                return {"status": "not_modified", "body": None, "cache": cached}
+            resp.raise_for_status()
+            body = _read_capped(resp, max_bytes)
+        metrics.observe("collect_fetch_seconds", time.perf_counter() - start, source=name)
+    metrics.inc("collect_fetch_bytes_total", len(body), source=name)
+
+    cache = {
+        "url": source["url"],
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "content_hash": content_digest(body),
+        "content_length": len(body),
+    }
+    if cached and cached.get("content_hash") == cache["content_hash"]:
+        return {"status": "unchanged", "body": None, "cache": cache}
+    return {"status": "fetched", "body": body, "cache": cache}
+
+
+def parse_feed(source: dict, body: bytes):
+    # Use raw bytes to let feedparser detect encoding correctly
+    with metrics.timer("collect_parse_seconds", source=source["name"]):
+        return feedparser.parse(body)
+
 
-    with feeds_path.open("r", encoding="utf-8") as fh:
-        cfg = yaml.safe_load(fh)
+def _parse_published(e) -> datetime | None:
+    # feedparser has already parsed the date into a UTC struct_time; dateutil is the fallback
+    parsed = e.get("published_parsed")
+    if parsed:
+        return datetime(*parsed[:6], tzinfo=timezone.utc)
+    if not e.get("published"):
+        return None
+    try:
+        dt = dtparser.parse(e.published)
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def feed_items(source: dict, feed, cursor: tuple[str, str] | None = None, limit: int | None = 50):
+    """Turn the first ``limit`` feed entries into item dicts, stopping at the source's cursor.
+
+    Every entry is kept; relevance is decided later by the FTS topic query. Sources
+    listed newest-first (arXiv, or ``sorted: true`` in feeds.yaml) stop at the first
+    entry that is older than, or identical to, the newest entry of the previous run.
+    Returns ``(items, newest)`` where ``newest`` is the ``(published_iso, id)`` to store as
+    the next cursor, or None if no dated entry was seen.
+    """
+    sorted_feed = source.get("sorted", source.get("type") == "arxiv")
+    stop_dt = stop_id = None
+    if cursor and sorted_feed:
+        stop_dt = datetime.fromisoformat(cursor[0])
+        stop_id = cursor[1]
 
     items = []
+    newest = None
+    for e in feed.entries[:limit]:
+        url = e.get("link", "")
+        title = (e.get("title") or "").strip()
+        pub_dt = _parse_published(e)
+        item_id = stable_id(source["name"], url, title)
+
+        if stop_dt is not None and pub_dt is not None:
+            if pub_dt < stop_dt or (pub_dt == stop_dt and item_id == stop_id):
+                break
+
+        if pub_dt is not None and (newest is None or pub_dt > newest[0]):
+            newest = (pub_dt, item_id)
+
+        published = pub_dt.isoformat() if pub_dt is not None else ""
+        summary = (e.get("summary") or e.get("description") or "").strip()
+        items.append(
+            {
+                "id": item_id,
+                "source": source["name"],
+                "title": title,
+                "url": url,
+                "published": published,
+                "published_ts": int(pub_dt.timestamp()) if pub_dt is not None else None,
+                "summary": summary,
+            }
+        )
+    if newest is not None:
+        newest = (newest[0].astimezone(timezone.utc).isoformat(), newest[1])
+    return items, newest
 
-    for s in cfg["sources"]:
-        if s.get("type") not in ("rss", "arxiv"):
+
+_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    # Bounded put that gives up once the run is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
             continue
 
+
+def _fetch_stage(sources, session, limiter, cached, max_bytes, workers, out: queue.Queue, stop):
+    """Download sources concurrently; each result is handed on as soon as it arrives."""
+
+    def fetch(s):
         try:
-            resp = requests.get(
-                s["url"],
-                headers={"User-Agent": "Mozilla/5.0 (compatible; ai-digest/1.0)"},
-                timeout=30,
-            )
-            resp.raise_for_status()
-            # Use raw bytes to let feedparser detect encoding correctly
-            feed = feedparser.parse(resp.content)
+            result = fetch_feed(session, limiter, s, cached.get(s["name"]), max_bytes)
+        except FeedTooLarge as ex:
+            result = {"status": "too_large", "error": ex}
         except Exception as ex:
-            logger.exception("FAILED to fetch %s -> %s: %s", s.get("name"), s.get("url"), ex)
-            continue
+            result = {"status": "failed", "error": ex}
+        _put(out, (s, result), stop)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch, sources))
+    finally:
+        _put(out, _DONE, stop)
 
-        for e in feed.entries[:50]:
-            url = e.get("link", "")
-            title = (e.get("title") or "").strip()
 
-            published = ""
-            if e.get("published"):
+def _parse_stage(inbox: queue.Queue, out: queue.Queue, cursors, stop):
+    """Parse fetched bodies and turn their entries into items, one source at a time."""
+    try:
+        while not stop.is_set():
+            msg = inbox.get()
+            if msg is _DONE:
+                break
+            s, result = msg
+            if result["status"] == "fetched":
                 try:
-                    published = dtparser.parse(e.published).isoformat()
-                except Exception:
-                    published = ""
+                    feed = parse_feed(s, result.pop("body"))
+                    with metrics.timer("collect_items_seconds", source=s["name"]):
+                        result["items"], result["newest"] = feed_items(s, feed, cursors.get(s["name"]))
+                except Exception as ex:
+                    result = {"status": "failed", "error": ex}
+            _put(out, (s, result), stop)
+    finally:
+        _put(out, _DONE, stop)
+
+
+def main(conn=None):
+    """Collect every source through a streaming fetch -> parse -> write pipeline.
+
+    Fetch workers, one parser thread and this thread (the only one touching the DB) are
+    joined by bounded queues. So at most COLLECT_WORKERS + 2 * COLLECT_QUEUE feed
+    bodies or parsed feeds are held at once, each capped at COLLECT_MAX_BYTES. Items are
+    written as they arrive, in transactions of about COLLECT_WRITE_BATCH items. Each
+    transaction also stores the validators and cursors of the sources it completes, so a
+    run that dies part-way keeps what it flushed. The next run skips those sources with
+    a conditional GET or stops at their cursor.
+    """
+    logging.basicConfig(level=logging.INFO)
+    # feeds.yaml is resolved relative to the project root so scripts can be run from any cwd.
+    path = feeds_path()
+    if not path.exists():
+        logger.error("feeds.yaml not found at %s", path)
+        return
+    cfg = load_config(path)
+
+    sources = [s for s in cfg["sources"] if s.get("type") in ("rss", "arxiv")]
+    workers = max(1, int(os.environ.get("COLLECT_WORKERS", "8")))
+    limiter = HostLimiter(int(os.environ.get("COLLECT_PER_HOST", "1")))
+    max_bytes = int(os.environ.get("COLLECT_MAX_BYTES", str(20 * 1024 * 1024)))
+    depth = max(1, int(os.environ.get("COLLECT_QUEUE", "4")))
+    write_batch = max(1, int(os.environ.get("COLLECT_WRITE_BATCH", "500")))
+    session = make_session(workers)
+
+    conn = conn or connect()
+    cached = get_feed_cache(conn)
+    cursors = get_source_cursors(conn)
+
+    fetched_q: queue.Queue = queue.Queue(maxsize=depth)
+    parsed_q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    stages = [
+        threading.Thread(
+            target=_fetch_stage,
+            args=(sources, session, limiter, cached, max_bytes, workers, fetched_q, stop),
+            name="collect-fetch",
+            daemon=True,
+        ),
+        threading.Thread(target=_parse_stage, args=(fetched_q, parsed_q, cursors, stop), name="collect-parse", daemon=True),
+    ]
 
-            summary = (e.get("summary") or e.get("description") or "").strip()
+    pending_items: list[dict] = []
+    pending_caches: dict[str, dict] = {}
+    pending_cursors: dict[str, tuple[str, str]] = {}
+    totals = {"items": 0, "new": 0, "merged": 0}
 
-            if not is_productivity_paper(title, summary):
-                continue
+    def flush():
+        if not (pending_items or pending_caches or pending_cursors):
+            return
+        with metrics.timer("collect_dedup_seconds"):
+            fresh, duplicates = dedupe(conn, pending_items)
+        save_collected(conn, fresh, duplicates, pending_caches, pending_cursors)
+        totals["items"] += len(pending_items)
+        totals["new"] += len(fresh)
+        totals["merged"] += len(duplicates)
+        metrics.inc("collect_flushes_total")
+        pending_items.clear()
+        pending_caches.clear()
+        pending_cursors.clear()
 
-            items.append(
-                {
-                    "id": stable_id(s["name"], url, title),
-                    "source": s["name"],
-                    "title": title,
-                    "url": url,
-                    "published": published,
-                    "summary": summary,
-                }
-            )
+    hits = 0
+    bytes_saved = 0
+    for t in stages:
+        t.start()
+    try:
+        with session:
+            while True:
+                msg = parsed_q.get()
+                if msg is _DONE:
+                    break
+                s, result = msg
+                status = result["status"]
+                metrics.inc("collect_sources_total", status=status)
+                if status == "too_large":
+                    logger.warning("Skipping %s -> %s: %s", s.get("name"), s.get("url"), result["error"])
+                    continue
+                if status == "failed":
+                    ex = result["error"]
+                    logger.error("FAILED to fetch %s -> %s: %s", s.get("name"), s.get("url"), ex, exc_info=ex)
+                    continue
+                if status == "not_modified":
+                    hits += 1
+                    bytes_saved += result["cache"].get("content_length", 0)
+                    continue
+                # Validators are only remembered together with the items they cover
+                pending_caches[s["name"]] = result["cache"]
+                if status == "unchanged":
+                    hits += 1
+                else:
+                    metrics.inc("collect_items_total", len(result["items"]), source=s["name"])
+                    pending_items.extend(result["items"])
+                    newest = result["newest"]
+                    prev = cursors.get(s["name"])
+                    if newest is not None and (
+                        prev is None or datetime.fromisoformat(newest[0]) >= datetime.fromisoformat(prev[0])
+                    ):
+                        pending_cursors[s["name"]] = newest
+                if len(pending_items) >= write_batch:
+                    flush()
+            flush()
+    finally:
+        stop.set()
+        for t in stages:
+            t.join(timeout=5)
 
-    conn = connect()
-    upsert_items(conn, items)
-    logger.info("Collected %d items", len(items))
+    logger.info(
+        "Collected %d items (%d new, %d merged into known papers)", totals["items"], totals["new"], totals["merged"]
+    )
+    logger.info("Feed cache: %d/%d sources unchanged, %d bytes not downloaded", hits, len(sources), bytes_saved)
+    metrics.inc("collect_cache_bytes_saved_total", bytes_saved)
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
@@ -0,0 +1,44 @@
+"""Loading feeds.yaml."""
+import os
+from pathlib import Path
+
+import yaml
+
+from matcher import topic_queries
+
+
+def feeds_path() -> Path:
+    """$FEEDS_PATH, or feeds.yaml at the project root."""
+    base = Path(__file__).resolve().parent.parent
+    return Path(os.environ.get("FEEDS_PATH", str(base / "feeds.yaml")))
+
+
+def load_config(path: str | Path | None = None) -> dict:
+    """Parse feeds.yaml; a missing file gives an empty config."""
+    path = Path(path) if path else feeds_path()
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as fh:
+        return yaml.safe_load(fh) or {}
+
+
+def topics(cfg: dict | None = None) -> dict[str, list[str] | None]:
+    """The configured topic filter, ready for ``store.search_items``."""
+    return topic_queries(load_config() if cfg is None else cfg)
+
+
+def subscribers(cfg: dict | None = None) -> list[dict]:
+    """Digest recipients: ``$SUBSCRIBERS_PATH``'s or feeds.yaml's ``subscribers`` list.
+
+    Without either, the single recipient is $DIGEST_TO (or $SMTP_USER) with no filters.
+    """
+    path = os.environ.get("SUBSCRIBERS_PATH")
+    if path:
+        cfg = load_config(path)
+    elif cfg is None:
+        cfg = load_config()
+    subs = [s for s in cfg.get("subscribers") or [] if s.get("to")]
+    if subs:
+        return subs
+    to = os.environ.get("DIGEST_TO") or os.environ.get("SMTP_USER")
+    return [{"to": to}] if to else []
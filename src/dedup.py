@@ -0,0 +1,268 @@
+"""Cross-source duplicate detection.
+
+A paper that is cross-listed in several arXiv categories, bumped from v1 to v2, or
+linked from a blog should be stored, summarized and rendered once. Items are matched in
+two steps:
+
+1. An exact ``canonical_key``: the versionless arXiv id for arXiv links, otherwise the
+   URL without scheme, ``www.``, trailing slash and tracking parameters. An item with
+   no link is keyed by its own id and never matches exactly.
+2. Near-duplicates by MinHash over word shingles of title + abstract. Candidates come
+   from LSH band buckets stored next to the items. A candidate is a duplicate when the
+   estimated Jaccard similarity is at least DEDUP_THRESHOLD (default 0.8).
+
+A duplicate is not stored again. Its source is attached to the canonical item instead.
+An exact match with an archived item (see archive.py) is dropped: the cold partitions are
+append-only, so the new sighting is not recorded there.
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+import metrics
+from store import (
+    attach_sources,
+    find_archived_ids,
+    find_canonical_ids,
+    get_signatures,
+    index_items,
+    lsh_candidates,
+    remove_items,
+)
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+# Too few shingles make the similarity estimate meaningless (short titles, empty abstracts)
+MIN_SHINGLES = 8
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_PERM_A = np.array([a for a, _ in _PERMS], dtype=np.uint64)[:, None]
+_PERM_B = np.array([b for _, b in _PERMS], dtype=np.uint64)[:, None]
+_P = np.uint64(_PRIME)
+_LO32 = np.uint64(0xFFFFFFFF)
+_LO29 = np.uint64((1 << 29) - 1)
+
+_ARXIV_RE = re.compile(
+    r"(?:arxiv\.org/(?:abs|pdf|html)/|arxiv[:.])"
+    r"(\d{4}\.\d{4,5}|[a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7})(?:v\d+)?",
+    re.IGNORECASE,
+)
+# Click and campaign ids only; names like ``ref`` or ``source`` often select real content
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref_src", "sc_channel"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def arxiv_id(text: str) -> str | None:
+    """The versionless arXiv id in a URL or ``arXiv:`` reference, e.g. ``2601.10712``."""
+    m = _ARXIV_RE.search(text or "")
+    return m.group(1).lower() if m else None
+
+
+def canonical_url(url: str) -> str:
+    """``url`` without scheme, ``www.``, trailing slash and tracking parameters.
+
+    The fragment is kept: release notes and changelogs give each entry its own anchor.
+    """
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    path = parts.path.rstrip("/") or "/"
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    out = host + path + ("?" + urlencode(sorted(query)) if query else "")
+    return out + ("#" + parts.fragment if parts.fragment else "")
+
+
+def canonical_key(url: str, item_id: str | None = None) -> str:
+    """The versionless arXiv id, else the canonical URL, else (no link at all) the item id."""
+    aid = arxiv_id(url)
+    if aid:
+        return f"arxiv:{aid}"
+    if not (url or "").strip():
+        return f"id:{item_id}"
+    return f"url:{canonical_url(url)}"
+
+
+def _mod_prime(x):
+    # x mod 2**61 - 1 for uint64 x, using 2**61 = 1 (mod p)
+    x = (x & _P) + (x >> np.uint64(61))
+    return np.where(x >= _P, x - _P, x)
+
+
+def _mulmod(a, h):
+    """``a * h mod 2**61 - 1`` for uint64 arrays below 2**61, without 128-bit products."""
+    a1, a0 = a >> np.uint64(32), a & _LO32
+    h1, h0 = h >> np.uint64(32), h & _LO32
+    mid = a1 * h0 + a0 * h1
+    # a*h = a1*h1 * 2**64 + mid * 2**32 + a0*h0, with 2**64 = 8 and 2**61 = 1 (mod p)
+    high = (a1 * h1) << np.uint64(3)
+    middle = (mid >> np.uint64(29)) + ((mid & _LO29) << np.uint64(32))
+    return _mod_prime(high + middle + _mod_prime(a0 * h0))
+
+
+def minhash(title: str, summary: str) -> tuple[int, ...] | None:
+    """MinHash signature of the title + abstract word shingles, or None if the text is too short.
+
+    Each permutation is ``(a * h + b) mod 2**61 - 1`` over the shingle hashes ``h``. All
+    permutations are evaluated at once in NumPy, and the result equals the exact integer
+    arithmetic, so signatures stored by earlier versions still compare correctly.
+    """
+    tokens = _TOKEN_RE.findall(f"{title} {summary}".lower())
+    shingles = {" ".join(tokens[i : i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    hashes = _mod_prime(np.frombuffer(digests, dtype="<u8"))[None, :]
+    return tuple(int(v) for v in _mod_prime(_mulmod(_PERM_A, hashes) + _PERM_B).min(axis=1))
+
+
+def lsh_buckets(signature) -> list[str]:
+    out = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(repr(rows).encode("ascii"), digest_size=8).hexdigest()
+        out.append(f"{band}:{digest}")
+    return out
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class DuplicateIndex:
+    """Finds the canonical item for new items, across the DB and the batch being added."""
+
+    def __init__(self, conn, threshold: float | None = None):
+        self.conn = conn
+        self.threshold = threshold if threshold is not None else float(os.environ.get("DEDUP_THRESHOLD", "0.8"))
+        self._keys: dict[str, str] = {}
+        self._archived: dict[str, str] = {}
+        self._buckets: dict[str, set[str]] = {}
+        self._signatures: dict[str, tuple] = {}
+        self._looked_up: set[str] = set()
+
+    def match(self, key: str, signature, buckets) -> tuple[str, str] | None:
+        """Return ``(canonical_id, "exact" | "near" | "archived")`` for a known paper, else None."""
+        found = self._keys.get(key)
+        if not found and key not in self._looked_up:
+            found = find_canonical_ids(self.conn, [key]).get(key)
+        if found:
+            return found, "exact"
+        archived = self._archived.get(key)
+        if not archived and key not in self._looked_up:
+            archived = find_archived_ids(self.conn, [key]).get(key)
+        if archived:
+            return archived, "archived"
+        if signature is None:
+            return None
+        local = set().union(*(self._buckets.get(b, ()) for b in buckets))
+        stored = lsh_candidates(self.conn, buckets) - local
+        candidates = {i: self._signatures[i] for i in local}
+        candidates.update(get_signatures(self.conn, stored))
+        best = max(candidates.items(), key=lambda kv: similarity(signature, kv[1]), default=None)
+        if best is not None and similarity(signature, best[1]) >= self.threshold:
+            return best[0], "near"
+        return None
+
+    def preload(self, keys):
+        """Resolve many exact keys with one query, so ``match`` needs no lookup for them."""
+        keys = set(keys)
+        for key, item_id in find_canonical_ids(self.conn, keys).items():
+            self._keys.setdefault(key, item_id)
+        self._archived.update(find_archived_ids(self.conn, keys))
+        self._looked_up.update(keys)
+
+    def add(self, item_id: str, key: str, signature, buckets):
+        self._keys[key] = item_id
+        if signature is not None:
+            self._signatures[item_id] = signature
+            for b in buckets:
+                self._buckets.setdefault(b, set()).add(item_id)
+
+
+def _prepare(it: dict):
+    it["canonical_key"] = canonical_key(it["url"], it["id"])
+    it["minhash"] = minhash(it["title"], it.get("summary", ""))
+    it["lsh_buckets"] = lsh_buckets(it["minhash"]) if it["minhash"] is not None else []
+
+
+def dedupe(conn, items: list[dict]) -> tuple[list[dict], list[tuple[str, str, str]]]:
+    """Split freshly collected items into new papers and duplicates of known ones.
+
+    New items gain ``canonical_key``, ``minhash`` and ``lsh_buckets`` for ``upsert_items``.
+    Duplicates come back as ``(canonical_id, source, url)`` rows for ``attach_sources``.
+    Items already stored under their own id, and copies of archived papers, are dropped.
+    """
+    index = DuplicateIndex(conn)
+    for it in items:
+        _prepare(it)
+    index.preload(it["canonical_key"] for it in items)
+    fresh, duplicates = [], []
+    for it in items:
+        found = index.match(it["canonical_key"], it["minhash"], it["lsh_buckets"])
+        if found is None:
+            index.add(it["id"], it["canonical_key"], it["minhash"], it["lsh_buckets"])
+            fresh.append(it)
+        elif found[1] == "archived":
+            metrics.inc("dedup_merged_total", kind="archived")
+        elif found[0] != it["id"]:
+            logger.debug("%s: %r duplicates %s (%s)", it["source"], it["title"], found[0], found[1])
+            metrics.inc("dedup_merged_total", kind=found[1])
+            duplicates.append((found[0], it["source"], it["url"]))
+    return fresh, duplicates
+
+
+def rekey(conn):
+    """Recompute the stored canonical keys after the key rules changed.
+
+    The rules only ever get finer, so two items with distinct keys keep distinct keys and
+    the UNIQUE index cannot trip halfway through.
+    """
+    rows = conn.execute("SELECT id, url FROM items").fetchall()
+    conn.executemany(
+        "UPDATE items SET canonical_key = ? WHERE id = ?",
+        ((canonical_key(url, item_id), item_id) for item_id, url in rows),
+    )
+    conn.commit()
+
+
+def backfill(conn):
+    """Index every stored item and fold existing duplicates into one canonical row each.
+
+    Rows that already have an AI summary are preferred as the canonical copy, then the
+    oldest, so no summary is thrown away.
+    """
+    rows = conn.execute(
+        "SELECT id, source, title, url, summary FROM items "
+        "ORDER BY (ai_summary IS NULL OR ai_summary = ''), published_ts, rowid"
+    ).fetchall()
+    index = DuplicateIndex(conn)
+    keep, duplicates = [], []
+    for item_id, source, title, url, summary in rows:
+        it = {"id": item_id, "source": source, "title": title or "", "url": url or "", "summary": summary or ""}
+        _prepare(it)
+        found = index.match(it["canonical_key"], it["minhash"], it["lsh_buckets"])
+        if found is None:
+            index.add(item_id, it["canonical_key"], it["minhash"], it["lsh_buckets"])
+            keep.append(it)
+        else:
+            duplicates.append((found[0], source, url, item_id))
+    index_items(conn, keep)
+    remove_items(conn, [d[3] for d in duplicates])
+    attach_sources(conn, [d[:3] for d in duplicates])
+    if duplicates:
+        logger.info("Merged %d duplicate items into %d canonical items", len(duplicates), len(keep))
@@ -0,0 +1,114 @@
+"""Batch extractive summarizer: TF-IDF sentence centrality, vectorized with NumPy.
+
+All texts are scored in one pass. Each sentence becomes a unit-length TF-IDF vector,
+with IDF taken over the whole batch. A sentence scores by the summed cosine similarity
+to the other sentences of its text (LexRank-style degree centrality, computed as a dot
+product with the text's centroid). The best ``max_sentences`` are kept in their
+original order. No model or network access is needed.
+"""
+import re
+
+import numpy as np
+
+# Same boundary rule as summarize.summarize_text
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+|\x01")
+_SEP = "\x01"
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have how in into is it its "
+    "not of on or our than that the their them then there these they this those to was we "
+    "were what when where which while who will with within without you your".split()
+)
+
+# Texts are tokenized this many at a time to bound the size of the intermediate lists
+_TOKENIZE_BATCH = 10000
+
+
+def _truncate(summary: str, max_chars: int) -> str:
+    if len(summary) > max_chars:
+        return summary[: max_chars - 1].rsplit(" ", 1)[0] + "…"
+    return summary
+
+
+def _tokenize(sentences: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Hashed tokens and the index of the sentence each one belongs to."""
+    sep_hash = hash(_SEP)
+    terms, rows = [], []
+    offset = 0
+    for start in range(0, len(sentences), _TOKENIZE_BATCH):
+        chunk = sentences[start : start + _TOKENIZE_BATCH]
+        tokens = _TOKEN_RE.findall(_SEP.join(chunk).lower() + _SEP)
+        hashed = np.fromiter(map(hash, tokens), np.int64, len(tokens))
+        is_sep = hashed == sep_hash
+        row = offset + np.cumsum(is_sep) - is_sep
+        terms.append(hashed[~is_sep])
+        rows.append(row[~is_sep])
+        offset += len(chunk)
+    if not terms:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(terms), np.concatenate(rows)
+
+
+def sentence_scores(sentences: list[str], doc_of: np.ndarray) -> np.ndarray:
+    """Centrality score per sentence; ``doc_of[i]`` is the text sentence ``i`` belongs to."""
+    n = len(sentences)
+    terms, rows = _tokenize(sentences)
+    vocab, term_ids = np.unique(terms, return_inverse=True)
+    # Stopwords are dropped after the vocabulary is built: one lookup per distinct term
+    stop = np.fromiter((hash(w) for w in STOPWORDS), np.int64, len(STOPWORDS))
+    keep = ~np.isin(vocab, stop)[term_ids]
+    term_ids, rows = term_ids[keep], rows[keep]
+    if term_ids.size == 0:
+        return np.zeros(n)
+    n_terms = len(vocab)
+
+    # Sparse (sentence, term) counts
+    pair, tf = np.unique(rows * n_terms + term_ids, return_counts=True)
+    s_idx, t_idx = pair // n_terms, pair % n_terms
+    d_idx = doc_of[s_idx]
+
+    # One entry per (text, term): gives document frequencies and the centroid slots
+    dt_key, dt_inv = np.unique(d_idx * n_terms + t_idx, return_inverse=True)
+    n_docs = int(doc_of.max()) + 1
+    df = np.bincount(dt_key % n_terms, minlength=n_terms)
+    idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+
+    w = (1.0 + np.log(tf)) * idf[t_idx]
+    norm = np.sqrt(np.bincount(s_idx, weights=w * w, minlength=n))
+    w = w / norm[s_idx]
+
+    # A sentence's score is its cosine similarity to the other sentences of its text
+    centroid = np.bincount(dt_inv, weights=w, minlength=len(dt_key))
+    scores = np.bincount(s_idx, weights=w * (centroid[dt_inv] - w), minlength=n)
+
+    # Very short fragments ("Code is available.") rarely carry the contribution
+    length = np.bincount(rows, minlength=n)
+    return scores * np.minimum(1.0, length / 8.0)
+
+
+def summarize_many(texts: list[str], max_sentences: int = 2, max_chars: int = 400) -> list[str]:
+    """Extractive summaries for ``texts``, one per input, scored as a single batch."""
+    sentences, doc_of, position = [], [], []
+    for d, text in enumerate(texts):
+        parts = [p for p in _SENTENCE_RE.split(" ".join((text or "").split())) if p]
+        sentences.extend(parts)
+        doc_of.extend([d] * len(parts))
+        position.extend(range(len(parts)))
+    if not sentences:
+        return ["" for _ in texts]
+    doc_of = np.asarray(doc_of, dtype=np.int64)
+    position = np.asarray(position, dtype=np.int64)
+
+    scores = sentence_scores(sentences, doc_of)
+    # Rank sentences within each text, best first; ties go to the earlier sentence
+    order = np.lexsort((position, -scores, doc_of))
+    starts = np.searchsorted(doc_of[order], np.arange(len(texts)))
+    rank = np.arange(len(order)) - starts[doc_of[order]]
+    chosen = order[rank < max_sentences]
+    chosen = chosen[np.lexsort((position[chosen], doc_of[chosen]))]
+
+    picked = [[] for _ in texts]
+    for i in chosen.tolist():
+        picked[doc_of[i]].append(sentences[i])
+    return [_truncate(" ".join(p).strip(), max_chars) for p in picked]
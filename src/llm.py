@@ -1,10 +1,17 @@
 import os
+import html
+import json
+import math
 import time
 import random
-import requests
+import threading
 import logging
 import re
-from typing import Optional
+from pathlib import Path
+from typing import Callable, Optional
+import metrics
+from llm_cache import ResponseCache
+from ratelimit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
@@ -60,7 +67,237 @@ def _clean_and_truncate(text: str, max_chars: int) -> str:
     return text
 
 
-_last_request_time: float = 0.0
+# Markup and boilerplate that cost prompt tokens without telling the model anything
+_TAG_RE = re.compile(r"<[^>]+>")
+_ARXIV_PREFIX_RE = re.compile(r"^\s*arXiv:\S+\s+Announce Type:\s*\S+\s*Abstract:\s*", re.IGNORECASE)
+_TRAILER_RE = re.compile(r"\s(?:Comments|Journal-ref|Report-no|MSC-class|ACM-class|DOI):.*$", re.DOTALL)
+_LATEX_DROP_RE = re.compile(r"\\(?:cite[pt]?|ref|eqref|label|footnote)\*?\{[^{}]*\}")
+_LATEX_UNWRAP_RE = re.compile(r"\\(?:[a-zA-Z]+)\*?\{([^{}]*)\}")
+_LATEX_CMD_RE = re.compile(r"\\([a-zA-Z]+)")
+_LATEX_ESCAPE_RE = re.compile(r"\\([%&#_])")
+_SPACE_PUNCT_RE = re.compile(r"\s+([.,;:!?)])")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_URL_RE = re.compile(
+    r"\s*[(\[]?(?:https?://|\bgithub\.com/)[^\s)\]]*?[)\]]?([;:]?)[.,!?]?[)\]]?(?=\s|$)", re.IGNORECASE
+)
+# What is left of "Code is available at <url>."-style sentences once the URL is gone
+_POINTER_WORDS = frozenset(
+    "a all an and applicable are at available be can code data dataset datasets demo"
+    " details for found from github here implementation implementations in is made model models"
+    " of on online open open-source open-sourced our page project publicly release"
+    " released repository see source the this to upon via visit we weights will with".split()
+)
+_DANGLING_RE = re.compile(r"[\s(\[]*(?:\b(?:at|via|from|here|in|on)\b)?[\s:(\[\])]*$", re.IGNORECASE)
+
+
+def _strip_urls(sentence: str) -> str:
+    """``sentence`` without its URLs; empty when nothing but a pointer to them is left."""
+    if not _URL_RE.search(sentence):
+        return sentence
+    end = sentence.rstrip()[-1:]
+    rest = _URL_RE.sub(r"\1 ", sentence)
+    rest = _DANGLING_RE.sub("", " ".join(rest.split()).rstrip(".!?"))
+    words = re.findall(r"[\w-]+", rest.lower())
+    if not any(w not in _POINTER_WORDS for w in words):
+        return ""
+    return rest + (end if end and end in "!?" else ".")
+
+
+def compact_abstract(text: str, max_tokens: Optional[int] = None) -> str:
+    """Strip HTML, LaTeX markup and boilerplate from an abstract before it is sent.
+
+    Tags and entities are removed, ``\\emph{x}``-style commands are unwrapped, citations
+    and ``$`` delimiters are dropped, and ``\\alpha`` becomes ``alpha``. The arXiv RSS
+    ``Announce Type`` prefix and trailing ``Comments:``-style metadata are cut. URLs are
+    removed from the sentences that mention them, and a sentence that only pointed at a
+    code or data URL is dropped. With ``max_tokens``, the text is cut at the last
+    sentence that fits (see ``estimate_tokens``).
+
+    >>> compact_abstract("We release a 10k-task benchmark with strong baselines at "
+    ...                  "https://github.com/x/y. Results improve 20%.")
+    'We release a 10k-task benchmark with strong baselines. Results improve 20%.'
+    >>> compact_abstract("Results improve 20%. Code is available at https://github.com/x/y.")
+    'Results improve 20%.'
+    """
+    if not text:
+        return ""
+    text = html.unescape(_TAG_RE.sub(" ", text))
+    text = _ARXIV_PREFIX_RE.sub("", text)
+    text = _TRAILER_RE.sub("", text)
+    text = _LATEX_DROP_RE.sub("", text)
+    # Unwrap from the inside out, e.g. \textbf{\emph{x}}
+    while True:
+        unwrapped = _LATEX_UNWRAP_RE.sub(r"\1", text)
+        if unwrapped == text:
+            break
+        text = unwrapped
+    text = _LATEX_CMD_RE.sub(r" \1", text)
+    text = _LATEX_ESCAPE_RE.sub(r"\1", text)
+    text = text.replace("$", "").replace("~", " ").replace("{", "").replace("}", "")
+    text = _SPACE_PUNCT_RE.sub(r"\1", " ".join(text.split()))
+    sentences = [s for s in map(_strip_urls, _SENTENCE_RE.split(text)) if s]
+    if max_tokens:
+        kept, used = [], 0
+        for sentence in sentences:
+            used += estimate_tokens(sentence) + 1
+            if kept and used > max_tokens:
+                break
+            kept.append(sentence)
+        sentences = kept
+    return " ".join(sentences)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough local token count: about 4 characters per token for English prose.
+
+    Gemini's tokenizer is not available offline. This estimate is close for abstracts
+    and slightly high for plain words, which is the safe side for a budget.
+    """
+    return math.ceil(len(text or "") / 4)
+
+
+class BudgetExhausted(RuntimeError):
+    """The run's LLM_RUN_TOKEN_BUDGET or LLM_RUN_REQUEST_BUDGET is used up."""
+
+
+class RunBudget:
+    """Thread-safe cap on the tokens and requests one run may spend on the API.
+
+    A call reserves its estimated input tokens plus its output limit, and one request,
+    before it is sent. ``settle`` replaces the reservation with the tokens the response
+    reports, so the unused output allowance is returned. After the first refusal every
+    later call is refused too, so allowance returned by calls still in flight is not
+    picked up by lower-priority items queued behind. A limit of 0 means no limit.
+    """
+
+    def __init__(self, tokens: int = 0, requests: int = 0):
+        self.tokens = tokens
+        self.requests = requests
+        self.tokens_used = 0
+        self.requests_used = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int):
+        """Reserve ``tokens`` and one request, or raise BudgetExhausted."""
+        with self._lock:
+            if (
+                self.refused
+                or (self.requests and self.requests_used + 1 > self.requests)
+                or (self.tokens and self.tokens_used + tokens > self.tokens)
+            ):
+                self.refused += 1
+                raise BudgetExhausted(
+                    f"LLM budget used: {self.tokens_used}/{self.tokens or 'unlimited'} tokens, "
+                    f"{self.requests_used}/{self.requests or 'unlimited'} requests"
+                )
+            self.tokens_used += tokens
+            self.requests_used += 1
+
+    def settle(self, reserved: int, actual: int):
+        with self._lock:
+            self.tokens_used += actual - reserved
+
+    def exhausted(self, tokens: int = 1) -> bool:
+        """Whether a call needing ``tokens`` would be refused now."""
+        with self._lock:
+            return bool(
+                self.refused
+                or (self.requests and self.requests_used >= self.requests)
+                or (self.tokens and self.tokens_used + tokens > self.tokens)
+            )
+
+
+_state_lock = threading.Lock()
+_session = None
+_limiter: Optional[TokenBucket] = None
+_limiter_key: tuple = ()
+_cache: Optional[ResponseCache] = None
+_cache_checked = False
+_budget: Optional[RunBudget] = None
+
+
+def _get_session():
+    """Shared keep-alive session; sized for the summarization worker pool."""
+    global _session
+    with _state_lock:
+        if _session is None:
+            # requests is imported here so stages that never call the API don't pay for it
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool = max(1, int(os.environ.get("SUMMARIZE_WORKERS", "4")))
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+            _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        return _session
+
+
+def _get_limiter(rpm: int) -> TokenBucket:
+    """Process-wide limiter shared by every worker thread calling the API."""
+    global _limiter, _limiter_key
+    burst = float(os.environ.get("GEMINI_BURST", "1"))
+    key = (rpm, burst)
+    with _state_lock:
+        if _limiter is None or _limiter_key != key:
+            _limiter = TokenBucket(max(1, rpm) / 60.0, burst)
+            _limiter_key = key
+        return _limiter
+
+
+def _get_cache() -> Optional[ResponseCache]:
+    """Persistent response cache, or None when disabled with LLM_CACHE=0."""
+    global _cache, _cache_checked
+    with _state_lock:
+        if not _cache_checked:
+            _cache_checked = True
+            if os.environ.get("LLM_CACHE", "1") not in ("0", "false", "False"):
+                default_path = Path(__file__).resolve().parent.parent / "data" / "llm_cache.sqlite"
+                _cache = ResponseCache(
+                    os.environ.get("LLM_CACHE_PATH", str(default_path)),
+                    ttl=float(os.environ.get("LLM_CACHE_TTL_DAYS", "30")) * 86400,
+                    max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "20000")),
+                )
+        return _cache
+
+
+def get_budget() -> RunBudget:
+    """This process's LLM budget, from LLM_RUN_TOKEN_BUDGET and LLM_RUN_REQUEST_BUDGET."""
+    global _budget
+    with _state_lock:
+        if _budget is None:
+            _budget = RunBudget(
+                int(os.environ.get("LLM_RUN_TOKEN_BUDGET", "0")),
+                int(os.environ.get("LLM_RUN_REQUEST_BUDGET", "0")),
+            )
+        return _budget
+
+
+def reset_budget():
+    """Start a new run's budget, re-reading the environment."""
+    global _budget
+    with _state_lock:
+        _budget = None
+
+
+def log_budget_stats():
+    """Log what this run spent against its budget, if one is set."""
+    b = _budget
+    if b is not None and (b.tokens or b.requests):
+        logger.info(
+            "LLM budget: %d/%s tokens, %d/%s requests, %d call(s) refused",
+            b.tokens_used,
+            b.tokens or "unlimited",
+            b.requests_used,
+            b.requests or "unlimited",
+            b.refused,
+        )
+
+
+def log_cache_stats():
+    """Log this process's cache hit/miss counts, if the cache was used at all."""
+    if _cache is not None and (_cache.hits or _cache.misses):
+        logger.info("LLM cache: %d hits, %d misses", _cache.hits, _cache.misses)
 
 
 ITEM_PROMPT = (
@@ -69,12 +306,45 @@ ITEM_PROMPT = (
     "Write in plain English accessible to a technical audience.\n\n"
 )
 
+BATCH_PROMPT = (
+    "Summarize each of the following AI research abstracts in 2-3 concise sentences. "
+    "Focus on the key contribution, method, and result. "
+    "Write in plain English accessible to a technical audience. "
+    "The abstracts are given as a JSON array of objects with an \"id\" and an \"abstract\". "
+    "Return a JSON array with exactly one object per abstract, of the form "
+    "{\"id\": <the abstract's id>, \"summary\": <your summary>}.\n\n"
+)
+
+# Gemini structured output schema for BATCH_PROMPT responses
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "STRING"}, "summary": {"type": "STRING"}},
+        "required": ["id", "summary"],
+    },
+}
+
 DIGEST_PROMPT = (
     "You are given summaries of recent AI research papers. "
     "Write a brief 3-5 sentence overview highlighting the main themes and notable findings. "
     "Do not list individual papers; synthesize the trends.\n\n"
 )
 
+# Map step of the hierarchical digest: one group of a large week's summaries
+CHUNK_PROMPT = (
+    "You are given summaries of one group of recent AI research papers. "
+    "Write 2-3 sentences on the main themes and notable findings of this group. "
+    "Your notes will be merged with notes on the other groups, so be specific.\n\n"
+)
+
+# Reduce step: merge the per-group notes into the final overview
+REDUCE_PROMPT = (
+    "You are given notes on several groups of recent AI research papers from the same period. "
+    "Write a brief 3-5 sentence overview highlighting the main themes and notable findings across all groups. "
+    "Do not list individual papers; synthesize the trends.\n\n"
+)
+
 
 def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str = "") -> str:
     """Call Google Gemini generateContent API with retries, backoff and rate limiting.
@@ -84,29 +354,128 @@ def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str
     - GEMINI_API_KEY (required)
     - GEMINI_MAX_CHARS (optional, default 400)
     - GEMINI_RPM (requests per minute, optional, default 60)
+    - GEMINI_BURST (requests allowed back-to-back before RPM pacing applies, default 1)
     - GEMINI_MAX_RETRIES (optional, default 3)
+    - LLM_CACHE (set to 0 to disable the response cache), LLM_CACHE_PATH,
+      LLM_CACHE_TTL_DAYS (default 30), LLM_CACHE_MAX_ENTRIES (default 20000)
+    - LLM_RUN_TOKEN_BUDGET, LLM_RUN_REQUEST_BUDGET (per-run caps, default 0 = none)
 
-    The function will raise if configuration is missing or non-retryable errors occur.
+    Responses are cached by endpoint, system prompt, prompt and max_tokens. A cached
+    call costs neither latency nor quota. An uncached call raises BudgetExhausted when
+    the run's budget cannot cover the prompt estimate plus ``max_tokens``. Safe to call
+    from several threads; all calls share one rate limiter and one pooled session. The
+    function will raise if configuration is missing or non-retryable errors occur.
+    """
+    max_chars = int(os.environ.get("GEMINI_MAX_CHARS", "400"))
+    return _clean_and_truncate(_generate(prompt, max_tokens, system_prompt), max_chars)
+
+
+def _parse_batch(text: str, keys: set[str]) -> dict[str, str]:
+    """Parse a BATCH_PROMPT response into ``{key: summary}``; raises ValueError if malformed."""
+    text = text.strip()
+    if text.startswith("```"):
+        # Some models wrap JSON in a markdown fence despite responseMimeType
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        # Tolerate a wrapper object such as {"summaries": [...]}
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        raise ValueError("batch response is not a JSON array")
+    out = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        key = str(entry.get("id", ""))
+        summary = entry.get("summary")
+        if key in keys and isinstance(summary, str) and summary.strip():
+            out[key] = summary
+    if not out:
+        raise ValueError("batch response has no usable summaries")
+    return out
+
+
+def summarize_batch_with_gemini(texts: dict[str, str], max_tokens_per_item: int = 256) -> dict[str, str]:
+    """Summarize several abstracts in one generateContent request.
+
+    ``texts`` maps item ids to abstracts. The abstracts are sent as a JSON array under
+    short positional keys, so long item ids don't cost prompt tokens, and the model is
+    asked for structured JSON output. Returns ``{item_id: summary}`` for every abstract
+    that came back intact. Ids that are missing from the result, including all of them
+    when the response is malformed, are left for the caller to retry one by one.
+    Uses the same configuration, limiter and cache as ``summarize_with_gemini``.
+    """
+    if not texts:
+        return {}
+    max_chars = int(os.environ.get("GEMINI_MAX_CHARS", "400"))
+    ids = {str(n): item_id for n, item_id in enumerate(texts, 1)}
+    prompt = json.dumps([{"id": key, "abstract": texts[item_id]} for key, item_id in ids.items()], ensure_ascii=False)
+    config = {"responseMimeType": "application/json", "responseSchema": BATCH_RESPONSE_SCHEMA}
+
+    def valid(text: str) -> bool:
+        try:
+            _parse_batch(text, set(ids))
+            return True
+        except ValueError:
+            return False
+
+    text = _generate(prompt, max_tokens_per_item * len(texts), BATCH_PROMPT, config, validate=valid)
+    try:
+        parsed = _parse_batch(text, set(ids))
+    except ValueError as ex:
+        logger.warning("Malformed batch response for %d abstracts: %s", len(texts), ex)
+        return {}
+    return {ids[key]: _clean_and_truncate(summary, max_chars) for key, summary in parsed.items()}
+
+
+def _settle(budget: RunBudget, reserved: int, used: int):
+    budget.settle(reserved, used)
+    metrics.inc("llm_tokens_total", used)
+
+
+def _generate(
+    prompt: str,
+    max_tokens: int,
+    system_prompt: str = "",
+    generation_config: Optional[dict] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Run one generateContent request and return the raw response text.
+
+    Handles the response cache, the shared rate limiter, and retries with backoff.
+    ``generation_config`` is merged into the request's generationConfig. Only text that
+    passes ``validate`` (if given) is cached.
     """
     endpoint = os.environ.get("GEMINI_ENDPOINT", DEFAULT_ENDPOINT)
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY must be set in the environment to use LLM summarization")
 
-    max_chars = int(os.environ.get("GEMINI_MAX_CHARS", "400"))
     rpm = int(os.environ.get("GEMINI_RPM", "60"))
     max_retries = int(os.environ.get("GEMINI_MAX_RETRIES", "3"))
 
-    # Enforce simple rate limit across calls
-    global _last_request_time
-    min_interval = 60.0 / max(1, rpm)
-    now = time.monotonic()
-    wait = _last_request_time + min_interval - now
-    if wait > 0:
-        time.sleep(wait)
+    cache = _get_cache()
+    cache_key = None
+    if cache is not None:
+        key_parts = [endpoint, system_prompt, prompt, max_tokens]
+        if generation_config:
+            key_parts.append(json.dumps(generation_config, sort_keys=True))
+        cache_key = ResponseCache.key(*key_parts)
+        cached = cache.get(cache_key)
+        metrics.inc("llm_cache_lookups_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    limiter = _get_limiter(rpm)
+    session = _get_session()
 
     # Build Google Gemini generateContent payload
     full_prompt = system_prompt + prompt if system_prompt else prompt
+    # Cache hits are free; everything sent counts against the run's budget
+    budget = get_budget()
+    prompt_tokens = estimate_tokens(full_prompt)
+    reserved = prompt_tokens + max_tokens
+    budget.reserve(reserved)
     payload = {
         "contents": [
             {
@@ -115,6 +484,7 @@ def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str
         ],
         "generationConfig": {
             "maxOutputTokens": max_tokens,
+            **(generation_config or {}),
         },
     }
 
@@ -129,11 +499,20 @@ def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str
     attempt = 0
     while attempt < max_retries:
         attempt += 1
+        if attempt > 1:
+            # A retry is another request against the budget
+            try:
+                budget.reserve(0)
+            except BudgetExhausted:
+                _settle(budget, reserved, prompt_tokens)
+                raise
         try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=30)
-
-            # Update last request time on any attempt that reached the server
-            _last_request_time = time.monotonic()
+            # Every attempt, including retries, spends a token from the shared RPM budget
+            metrics.observe("llm_ratelimit_wait_seconds", limiter.acquire())
+            start = time.perf_counter()
+            resp = session.post(url, json=payload, headers=headers, timeout=30)
+            metrics.observe("llm_request_seconds", time.perf_counter() - start)
+            metrics.inc("llm_responses_total", status=resp.status_code)
 
             # Retry on server errors or rate limit responses
             if resp.status_code in (429, 500, 502, 503, 504):
@@ -142,10 +521,11 @@ def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str
                 if retry_after:
                     try:
                         ra = int(retry_after)
+                        metrics.observe("llm_retry_after_wait_seconds", ra)
                         time.sleep(ra)
                     except Exception:
                         pass
-                raise requests.HTTPError(f"Retryable status {resp.status_code}")
+                raise RuntimeError(f"Retryable status {resp.status_code}")
 
             resp.raise_for_status()
 
@@ -153,20 +533,30 @@ def summarize_with_gemini(prompt: str, max_tokens: int = 256, system_prompt: str
                 j = resp.json()
             except Exception:
                 text = resp.text.strip()
-                return _clean_and_truncate(text, max_chars)
+                _settle(budget, reserved, prompt_tokens + estimate_tokens(text))
+                return text
 
             text = _extract_text_from_response(j)
+            usage = j.get("usageMetadata") if isinstance(j, dict) else None
+            used = (usage or {}).get("totalTokenCount") or prompt_tokens + estimate_tokens(text or "")
+            _settle(budget, reserved, used)
             if text:
-                return _clean_and_truncate(text, max_chars)
+                if cache is not None and (validate is None or validate(text)):
+                    cache.put(cache_key, text)
+                return text
 
             logger.debug("Unexpected LLM response shape: %s", j)
-            return _clean_and_truncate(str(j), max_chars)
+            return str(j)
 
         except Exception as ex:
             logger.warning("LLM request attempt %d failed: %s", attempt, ex)
             if attempt >= max_retries:
+                _settle(budget, reserved, prompt_tokens)
                 logger.exception("LLM request failed after %d attempts", attempt)
+                metrics.inc("llm_failures_total")
                 raise
             # Exponential backoff with jitter
             backoff = (2 ** (attempt - 1)) + random.uniform(0, 1)
+            metrics.inc("llm_retries_total")
+            metrics.observe("llm_backoff_wait_seconds", backoff)
             time.sleep(backoff)
@@ -0,0 +1,83 @@
+import re
+
+DEFAULT_KEYWORDS = [
+    "productivity",
+    "workflow",
+    "copilot",
+    "assistant",
+    "agent",
+    "automation",
+    "human-ai",
+    "human ai",
+    "decision support",
+    "knowledge work",
+    "office",
+    "programming assistant",
+    "software engineering",
+    "developer productivity",
+    "task completion",
+    "information retrieval",
+    "search assistant",
+    "writing",
+    "coding",
+    "debugging",
+]
+
+_WORD = "a-z0-9"
+
+
+def fts_query(keywords, exclude=(), word_boundary: bool = False) -> str:
+    """Translate keyword rules into an equivalent SQLite FTS5 query.
+
+    Each keyword becomes a quoted phrase. Without ``word_boundary`` (or with a trailing
+    ``*``) the last word is a prefix, so "agent" still finds "agents". FTS5 matches whole
+    tokens, so a keyword can no longer match in the middle of a word.
+    """
+
+    def phrase(raw: str) -> str | None:
+        tokens = re.findall(f"[{_WORD}]+", raw.lower())
+        if not tokens:
+            return None
+        prefix = raw.endswith("*") or not word_boundary
+        return '"%s"%s' % (" ".join(tokens), "*" if prefix else "")
+
+    include = [p for p in dict.fromkeys(map(phrase, keywords)) if p]
+    if not include:
+        return ""
+    query = "(%s)" % " OR ".join(include)
+    excluded = [p for p in dict.fromkeys(map(phrase, exclude)) if p]
+    if excluded:
+        query += " NOT (%s)" % " OR ".join(excluded)
+    return query
+
+
+def topic_queries(cfg: dict) -> dict[str, list[str] | None]:
+    """FTS5 topic queries from feeds.yaml, mapped to the sources they apply to.
+
+    ``filters.topic_query`` (or a source's ``topic_query``) is used verbatim; otherwise the
+    query is derived from the ``filters`` keyword rules, with a source's own
+    ``keywords``, ``exclude`` and ``word_boundary`` applied. Sources with the
+    same query share it. When every source does, it maps to None and applies to all items.
+    """
+    filters = cfg.get("filters") or {}
+    base_boundary = bool(filters.get("word_boundary", False))
+    base_query = filters.get("topic_query") or fts_query(
+        filters.get("keywords") or DEFAULT_KEYWORDS, filters.get("exclude") or [], base_boundary
+    )
+
+    groups: dict[str, list[str]] = {}
+    for s in cfg.get("sources") or []:
+        if s.get("topic_query"):
+            query = s["topic_query"]
+        elif s.get("keywords") or s.get("exclude") or "word_boundary" in s:
+            query = fts_query(
+                s.get("keywords") or filters.get("keywords") or DEFAULT_KEYWORDS,
+                list(filters.get("exclude") or []) + list(s.get("exclude") or []),
+                bool(s.get("word_boundary", base_boundary)),
+            )
+        else:
+            query = base_query
+        groups.setdefault(query, []).append(s["name"])
+    if len(groups) <= 1:
+        return {next(iter(groups), base_query): None}
+    return groups
@@ -0,0 +1,180 @@
+"""In-process metrics for one pipeline run.
+
+Stages record counters (``inc``) and timings (``timer`` / ``observe``) under a metric
+name plus optional labels. At the end of a run ``write_reports`` exports everything as
+a JSON run report and as a Prometheus textfile (for node_exporter's textfile
+collector). Both go to METRICS_DIR, which defaults to data/metrics.
+
+Set AI_DIGEST_PROFILE=cprofile or AI_DIGEST_PROFILE=tracemalloc to profile an entry
+point that is started through ``run``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "ai_digest_"
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+# (name, labels) -> [count, sum, max]
+_timers: dict[tuple, list] = {}
+_started = time.time()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add ``value`` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record one duration sample."""
+    key = _key(name, labels)
+    with _lock:
+        t = _timers.get(key)
+        if t is None:
+            _timers[key] = [1, seconds, seconds]
+        else:
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Time the enclosed block and record it with ``observe``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def snapshot() -> dict:
+    """All metrics recorded so far, as plain JSON-serializable data."""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())]
+        timers = [
+            {"name": n, "labels": dict(l), "count": c, "sum": s, "max": m}
+            for (n, l), (c, s, m) in sorted(_timers.items())
+        ]
+    return {"started": _started, "finished": time.time(), "counters": counters, "timers": timers}
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+        _started = time.time()
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(snap: dict) -> str:
+    lines = []
+    seen = set()
+    for c in snap["counters"]:
+        name = PREFIX + c["name"]
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(c['labels'])} {c['value']:g}")
+    by_name: dict[str, list] = {}
+    for t in snap["timers"]:
+        by_name.setdefault(PREFIX + t["name"], []).append(t)
+    # Each metric family must be contiguous, so the _max gauges follow their summary
+    for name, samples in by_name.items():
+        lines.append(f"# TYPE {name} summary")
+        for t in samples:
+            labels = _labels(t["labels"])
+            lines.append(f"{name}_count{labels} {t['count']}")
+            lines.append(f"{name}_sum{labels} {t['sum']:.6f}")
+        lines.append(f"# TYPE {name}_max gauge")
+        for t in samples:
+            lines.append(f"{name}_max{_labels(t['labels'])} {t['max']:.6f}")
+    lines.append(f"# TYPE {PREFIX}last_run_timestamp_seconds gauge")
+    lines.append(f"{PREFIX}last_run_timestamp_seconds {snap['finished']:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_dir() -> Path:
+    default = Path(__file__).resolve().parent.parent / "data" / "metrics"
+    return Path(os.environ.get("METRICS_DIR", str(default)))
+
+
+def _write_atomic(path: Path, text: str):
+    # node_exporter may read the textfile at any moment, so never expose a partial file.
+    # The pid keeps concurrent runs (e.g. several summarize workers) off each other's temp file.
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def write_reports(directory: str | Path | None = None) -> Path:
+    """Write run_report.json and ai_digest.prom; returns the directory used."""
+    out = Path(directory) if directory else metrics_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    snap = snapshot()
+    _write_atomic(out / "run_report.json", json.dumps(snap, indent=2))
+    _write_atomic(out / "ai_digest.prom", prometheus_text(snap))
+    logger.info("Wrote metrics to %s", out)
+    return out
+
+
+def run(fn, *args, **kwargs):
+    """Call a stage entry point, optionally under a profiler, then write the reports."""
+    mode = os.environ.get("AI_DIGEST_PROFILE", "").lower()
+    try:
+        if mode == "cprofile":
+            import cProfile
+            import pstats
+
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(fn, *args, **kwargs)
+            finally:
+                out = metrics_dir()
+                out.mkdir(parents=True, exist_ok=True)
+                prof.dump_stats(str(out / "profile.pstats"))
+                stats = pstats.Stats(prof).sort_stats("cumulative")
+                logger.info("cProfile stats written to %s", out / "profile.pstats")
+                stats.print_stats(25)
+        elif mode == "tracemalloc":
+            import tracemalloc
+
+            tracemalloc.start(25)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                snap = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                out = metrics_dir()
+                out.mkdir(parents=True, exist_ok=True)
+                top = snap.statistics("lineno")[:25]
+                report = [f"peak traced memory: {peak / 1e6:.1f} MB"] + [str(s) for s in top]
+                (out / "tracemalloc.txt").write_text("\n".join(report) + "\n", encoding="utf-8")
+                logger.info("tracemalloc peak %.1f MB; top allocations in %s", peak / 1e6, out / "tracemalloc.txt")
+        return fn(*args, **kwargs)
+    finally:
+        try:
+            write_reports()
+        except Exception:
+            logger.exception("Failed to write metrics reports")
@@ -0,0 +1,228 @@
+"""Local relevance ranking for the RSS feed and the email.
+
+Each item is embedded once with a signed hashing vectorizer. It hashes unigrams and
+bigrams of the title (weighted twice) and abstract, without stopwords, into DIM float32
+values with sublinear counts and L2 normalization. The vector is appended to a raw
+memory-mapped file, data/vectors.f32, and the item's row in that file is recorded in
+the item_vectors table. Seed queries from the
+``ranking`` section of feeds.yaml are embedded the same way. An item's relevance is its
+best cosine similarity to any of them. Ranking is then one matrix-vector product per
+profile over the rows of the candidates, blended with an exponential recency decay.
+
+Archiving an item only deletes its item_vectors row, leaving an unused slot in the file.
+``compact`` rewrites the file once the unused share passes ``RANK_VECTORS_COMPACT``.
+
+The vectors file is derived data. If it is missing or shorter than item_vectors says
+(e.g. the DB was committed without it), it is rebuilt on the next run. CI keeps the
+file in the Actions cache under a key derived from the committed DB, so a run only
+restores a file that matches the item_vectors table it checked out.
+"""
+import logging
+import math
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+from extractive import STOPWORDS
+from store import (
+    add_vector_rows,
+    clear_vector_rows,
+    get_vector_rows,
+    items_without_vectors,
+    list_vector_rows,
+    replace_vector_rows,
+    vector_row_count,
+)
+
+logger = logging.getLogger(__name__)
+
+DIM = 512
+_ROW_BYTES = DIM * 4
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Items embedded per append when indexing a large backlog
+INDEX_BATCH = 5000
+
+
+def vectors_path() -> Path:
+    default = Path(__file__).resolve().parent.parent / "data" / "vectors.f32"
+    return Path(os.environ.get("RANK_VECTORS_PATH", str(default)))
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    """Hashing-vectorizer embeddings, one L2-normalized float32 row per text."""
+    rows, codes = [], []
+    for i, text in enumerate(texts):
+        tokens = [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        codes.extend(zlib.crc32(g.encode("utf-8")) for g in grams)
+        rows.extend([i] * len(grams))
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    if codes:
+        codes = np.asarray(codes, dtype=np.uint32)
+        # Low bits pick the bucket, the top bit the sign, so collisions tend to cancel out
+        sign = np.where(codes >> 31, -1.0, 1.0)
+        idx = np.asarray(rows, dtype=np.int64) * DIM + (codes & (DIM - 1))
+        out = np.bincount(idx, weights=sign, minlength=len(texts) * DIM).reshape(len(texts), DIM)
+        out = (np.sign(out) * np.log1p(np.abs(out))).astype(np.float32)
+    norm = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norm, 1e-12)
+
+
+def item_text(title: str, summary: str) -> str:
+    return f"{title or ''} {title or ''} {summary or ''}"
+
+
+class VectorStore:
+    """Append-only float32 matrix on disk, addressed through the item_vectors table."""
+
+    def __init__(self, conn, path: str | Path | None = None):
+        self.conn = conn
+        self.path = Path(path) if path else vectors_path()
+        self.rows = vector_row_count(conn)
+        on_disk = self.path.stat().st_size // _ROW_BYTES if self.path.exists() else 0
+        if on_disk < self.rows:
+            logger.warning("%s has %d of %d vectors; rebuilding it", self.path, on_disk, self.rows)
+            clear_vector_rows(conn)
+            self.rows = 0
+        if self.path.exists() and self.path.stat().st_size != self.rows * _ROW_BYTES:
+            # Rows written by a run that died before recording them
+            with open(self.path, "r+b") as fh:
+                fh.truncate(self.rows * _ROW_BYTES)
+
+    def append(self, items: list[tuple[str, str, str]]):
+        """Embed ``(id, title, summary)`` items and append their vectors."""
+        if not items:
+            return
+        vecs = embed([item_text(title, summary) for _, title, summary in items])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as fh:
+            fh.write(vecs.tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        # The DB only points at rows that are safely on disk
+        add_vector_rows(self.conn, [(item_id, self.rows + i) for i, (item_id, _, _) in enumerate(items)])
+        self.rows += len(items)
+
+    def matrix(self) -> np.ndarray:
+        if self.rows == 0:
+            return np.zeros((0, DIM), dtype=np.float32)
+        return np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.rows, DIM))
+
+
+def index_new(conn, store: VectorStore | None = None) -> int:
+    """Embed every stored item that has no vector yet; returns how many were added."""
+    store = store or VectorStore(conn)
+    added = 0
+    with metrics.timer("rank_index_seconds"):
+        while True:
+            batch = items_without_vectors(conn, INDEX_BATCH)
+            if not batch:
+                break
+            store.append(batch)
+            added += len(batch)
+    if added:
+        logger.info("Embedded %d new items (%d vectors in %s)", added, store.rows, store.path)
+    metrics.inc("rank_items_embedded_total", added)
+    return added
+
+
+def compact(conn, store: VectorStore | None = None, share: float | None = None) -> int:
+    """Drop the unused rows from the vectors file once they make up over ``share`` of it.
+
+    ``share`` defaults to ``RANK_VECTORS_COMPACT`` (0.5). The live rows are copied in
+    order to a new file and renumbered in item_vectors. Returns the rows dropped.
+    """
+    if share is None:
+        share = float(os.environ.get("RANK_VECTORS_COMPACT", "0.5"))
+    store = store or VectorStore(conn)
+    live = list_vector_rows(conn)
+    unused = store.rows - len(live)
+    if unused <= 0 or unused <= share * store.rows:
+        return 0
+    matrix = store.matrix()
+    tmp = store.path.with_name(store.path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        for start in range(0, len(live), INDEX_BATCH):
+            block = np.fromiter((row for _, row in live[start : start + INDEX_BATCH]), np.int64)
+            fh.write(np.asarray(matrix[block]).tobytes())
+        fh.flush()
+        os.fsync(fh.fileno())
+    del matrix
+    # File first: if the run dies before the DB is updated, item_vectors points past the
+    # end of the shorter file and VectorStore rebuilds it instead of misreading rows
+    os.replace(tmp, store.path)
+    replace_vector_rows(conn, [(item_id, i) for i, (item_id, _) in enumerate(live)])
+    store.rows = len(live)
+    logger.info("Compacted %s: dropped %d unused of %d rows", store.path, unused, unused + len(live))
+    return unused
+
+
+def profiles(cfg: dict) -> np.ndarray:
+    """Embedded seed queries from ``ranking.profiles``; the filter keywords if none are set."""
+    seeds = (cfg.get("ranking") or {}).get("profiles")
+    if not seeds:
+        from matcher import DEFAULT_KEYWORDS
+
+        seeds = [" ".join((cfg.get("filters") or {}).get("keywords") or DEFAULT_KEYWORDS)]
+    return embed(list(seeds))
+
+
+def rank(conn, rows, limit: int | None = None, cfg: dict | None = None, now: float | None = None):
+    """Order ``ITEM_COLUMNS`` rows by relevance plus recency, best first.
+
+    ``score = w * relevance + (1 - w) * 0.5 ** (age_days / half_life)``. Relevance is
+    rescaled so the best candidate scores 1. ``w`` is ``ranking.relevance_weight``
+    (default 0.7) and the half-life is ``ranking.half_life_days`` (default 7). Items
+    without a publication date score no recency.
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    if cfg is None:
+        from config import load_config
+
+        cfg = load_config()
+    settings = cfg.get("ranking") or {}
+    weight = float(settings.get("relevance_weight", 0.7))
+    half_life = float(settings.get("half_life_days", 7))
+    now = now if now is not None else time.time()
+
+    with metrics.timer("rank_seconds"):
+        store = VectorStore(conn)
+        ids = [r[0] for r in rows]
+        where = get_vector_rows(conn, ids)
+        missing = [(r[0], r[2], r[5]) for r in rows if r[0] not in where]
+        if missing:
+            store.append(missing)
+            where = get_vector_rows(conn, ids)
+        matrix = store.matrix()
+        vecs = matrix[np.fromiter((where[i] for i in ids), np.int64, len(ids))]
+        relevance = np.clip((vecs @ profiles(cfg).T).max(axis=1), 0.0, None)
+        if relevance.max() > 0:
+            relevance = relevance / relevance.max()
+        # Undated items get no recency credit rather than counting as brand new
+        age_days = np.array([(now - r[7]) / 86400 if r[7] else math.inf for r in rows])
+        recency = np.power(0.5, np.maximum(age_days, 0) / max(half_life, 1e-6))
+        scores = weight * relevance + (1 - weight) * recency
+        order = np.argsort(-scores, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+    return [rows[i] for i in order.tolist()]
+
+
+def score_all(conn, cfg: dict, store: VectorStore | None = None) -> np.ndarray:
+    """Relevance of every vector on disk, in row order (for benchmarks and ad-hoc queries)."""
+    store = store or VectorStore(conn)
+    matrix = store.matrix()
+    prof = profiles(cfg)
+    best = np.full(store.rows, -math.inf, dtype=np.float32)
+    # Row blocks keep the working set small on a multi-year history
+    for start in range(0, store.rows, 262144):
+        block = np.asarray(matrix[start : start + 262144])
+        best[start : start + len(block)] = (block @ prof.T).max(axis=1)
+    return best
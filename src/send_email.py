@@ -1,23 +1,29 @@
 import os
+import queue
 import smtplib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta, timezone
 from html import escape as html_escape
-from store import connect, recent_items
-from summarize import digest_summary
+from config import load_config, subscribers, topics
+from matcher import fts_query
+from ratelimit import TokenBucket
+from store import connect, filter_items, search_items
+from summarize import overview, week_overview
+from llm import log_cache_stats
+import metrics
 
 logger = logging.getLogger(__name__)
 
-def build_html(rows):
+def build_html(rows, overall: str | None = None, max_items: int = 40):
     parts = []
     parts.append("<h1>AI Research Digest</h1>")
     parts.append(f"<p>{datetime.now().strftime('%B %d, %Y')}</p>")
     # Build an overall AI summary for the digest by combining per-item ai_summary fields
-    combined_texts = [r[5] for r in rows if len(r) > 5 and r[5]]
-    if not combined_texts:
-        combined_texts = [r[4] for r in rows if len(r) > 4 and r[4]]
-    overall = digest_summary(combined_texts)
+    if overall is None:
+        overall = overview([r[5] for r in rows], [r[4] for r in rows])
     if overall:
         parts.append("<h2>Weekly AI Summary</h2>")
         parts.append(f"<p>{html_escape(overall)}</p>")
@@ -28,7 +34,7 @@ def build_html(rows):
         return "\n".join(parts)
 
     parts.append("<ol>")
-    for source, title, url, published, summary, ai_summary in rows[:40]:
+    for source, title, url, published, summary, ai_summary in rows[:max_items]:
         # Escape content inserted into HTML to avoid broken layout or injection
         src = html_escape(source or "")
         t = html_escape(title or "")
@@ -46,39 +52,185 @@ def build_html(rows):
     parts.append("</ol>")
     return "\n".join(parts)
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-    conn = connect()
-    since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    rows = recent_items(conn, since)
+class SmtpPool:
+    """A few authenticated SMTP sessions shared by the delivery workers.
 
-    html = build_html(rows)
+    Connections are opened on first use and kept for the whole run. At most ``size`` sends
+    run at once, however many threads call ``send``, so at most ``size`` sessions are ever
+    open. A send that fails on a broken session (disconnect, network error, 4xx reply)
+    drops that session and is retried once on a fresh one. Every message first takes a token from the
+    ``per_minute`` bucket, so the server sees at most that many sends a minute.
+    """
 
-    today = datetime.now().strftime("%B %d, %Y")
-    msg = MIMEText(html, "html", "utf-8")
-    msg["Subject"] = f"AI Research Digest — {today}"
+    def __init__(self, host: str, port: int, user: str, pwd: str, size: int = 2, per_minute: float = 60, starttls: bool = True):
+        self.host, self.port, self.user, self.pwd = host, port, user, pwd
+        self.starttls = starttls
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._limiter = TokenBucket(max(per_minute, 1e-3) / 60.0, min(self.size, per_minute))
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._open: list[smtplib.SMTP] = []
+
+    def _connect(self) -> smtplib.SMTP:
+        s = smtplib.SMTP(self.host, self.port, timeout=60)
+        try:
+            if self.starttls:
+                s.starttls()
+            s.login(self.user, self.pwd)
+        except Exception:
+            s.close()
+            raise
+        metrics.inc("email_connections_total")
+        with self._lock:
+            self._open.append(s)
+        return s
+
+    def _discard(self, s: smtplib.SMTP):
+        with self._lock:
+            if s in self._open:
+                self._open.remove(s)
+        try:
+            s.quit()
+        except Exception:
+            s.close()
+
+    def send(self, sender: str, rcpts: list[str], body: str):
+        self._limiter.acquire()
+        with self._slots:
+            self._send(sender, rcpts, body)
+
+    def _send(self, sender: str, rcpts: list[str], body: str):
+        for attempt in (1, 2):
+            s = None
+            if attempt == 1:
+                try:
+                    s = self._idle.get_nowait()
+                except queue.Empty:
+                    pass
+            # The retry always gets a new session; other idle ones may be just as stale
+            s = s or self._connect()
+            try:
+                with metrics.timer("email_send_seconds"):
+                    s.sendmail(sender, rcpts, body)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as ex:
+                self._discard(s)
+                permanent = isinstance(ex, smtplib.SMTPResponseException) and ex.smtp_code >= 500
+                if attempt == 2 or permanent:
+                    raise
+                logger.warning("SMTP send failed (%s); reconnecting", ex)
+                metrics.inc("email_reconnects_total")
+                continue
+            except Exception:
+                self._discard(s)
+                raise
+            self._idle.put(s)
+            return
+
+    def close(self):
+        with self._lock:
+            sessions, self._open = self._open, []
+        for s in sessions:
+            try:
+                s.quit()
+            except Exception:
+                s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def personalize(conn, rows, subscriber: dict):
+    """The subscriber's slice of the shared, ranked rows: their sources and keywords.
 
-    # Validate required env vars
+    Keywords go through ``matcher.fts_query``, the same translation as the feed's topic
+    filter, and sources are checked against every source a merged paper was seen in.
+    """
+    boundary = bool(subscriber.get("word_boundary", False))
+    match = fts_query(subscriber.get("keywords") or [], (), boundary)
+    exclude = fts_query(subscriber.get("exclude") or [], (), boundary)
+    sources = subscriber.get("sources")
+    if not (match or exclude or sources):
+        return list(rows)
+    keep = filter_items(conn, [r[0] for r in rows], match or None, exclude or None, sources)
+    return [r for r in rows if r[0] in keep]
+
+
+def main(conn=None, overall: str | None = None):
+    """Email the last week's items to every subscriber.
+
+    The week is queried and ranked once. Each subscriber gets a slice of it, filtered by
+    their ``sources``, ``keywords`` and ``exclude`` and cut to ``max_items`` (default 40).
+    All slices share one overview, ``summarize.week_overview`` unless the caller passes
+    ``overall`` (``""`` for none). Messages go out over a small pool of SMTP sessions
+    (SMTP_POOL_SIZE, default 2), paced by SMTP_RATE_PER_MIN (default 60).
+    """
+    logging.basicConfig(level=logging.INFO)
+    conn = conn or connect()
+    cfg = load_config()
+    recipients = subscribers(cfg)
+    if not recipients:
+        raise RuntimeError("No subscribers configured and neither DIGEST_TO nor SMTP_USER is set")
+    # Before the overview, which may be a paid LLM call
     missing = [k for k in ("SMTP_HOST", "SMTP_USER", "SMTP_PASS") if not os.environ.get(k)]
     if missing:
         raise RuntimeError(f"Missing required SMTP env vars: {', '.join(missing)}")
 
-    msg["From"] = os.environ["SMTP_USER"]
-    msg["To"] = os.environ.get("DIGEST_TO", os.environ["SMTP_USER"])
+    since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    # Best first, so each recipient's cut keeps the most relevant items of the week
+    from rank import rank
+
+    rows = rank(conn, search_items(conn, topics(cfg), since=since), cfg=cfg)
+    if overall is None:
+        overall = week_overview(conn, cfg)
+    log_cache_stats()
+
+    sender = os.environ["SMTP_USER"]
+    today = datetime.now().strftime("%B %d, %Y")
+
+    # Sliced here because the connection stays on this thread
+    slices = [[r[1:7] for r in personalize(conn, rows, sub)] for sub in recipients]
+
+    def render(sub: dict, mine: list) -> tuple[list[str], str, int]:
+        to = sub["to"] if isinstance(sub["to"], list) else [sub["to"]]
+        limit = int(sub.get("max_items", 40))
+        with metrics.timer("render_seconds", output="email"):
+            html = build_html(mine, overall, limit)
+        msg = MIMEText(html, "html", "utf-8")
+        msg["Subject"] = f"AI Research Digest — {today}"
+        msg["From"] = sender
+        msg["To"] = ", ".join(to)
+        return to, msg.as_string(), min(len(mine), limit)
+
+    pool = SmtpPool(
+        os.environ["SMTP_HOST"],
+        int(os.environ.get("SMTP_PORT", "587")),
+        sender,
+        os.environ["SMTP_PASS"],
+        size=int(os.environ.get("SMTP_POOL_SIZE", "2")),
+        per_minute=float(os.environ.get("SMTP_RATE_PER_MIN", "60")),
+        starttls=os.environ.get("SMTP_STARTTLS", "1") not in ("0", "false", "False"),
+    )
 
-    host = os.environ["SMTP_HOST"]
-    port = int(os.environ.get("SMTP_PORT", "587"))
-    user = os.environ["SMTP_USER"]
-    pwd = os.environ["SMTP_PASS"]
+    def deliver(sub: dict, mine: list) -> bool:
+        to = sub.get("to")
+        try:
+            to, body, count = render(sub, mine)
+            pool.send(sender, to, body)
+        except Exception:
+            logger.exception("Failed to send digest to %s", to)
+            metrics.inc("email_failed_total")
+            return False
+        metrics.inc("email_sent_total")
+        logger.info("Sent digest to %s with %d items", ", ".join(to), count)
+        return True
 
-    try:
-        with smtplib.SMTP(host, port) as s:
-            s.starttls()
-            s.login(user, pwd)
-            s.sendmail(msg["From"], [msg["To"]], msg.as_string())
-        logger.info("Sent digest to %s with %d items", msg["To"], len(rows))
-    except Exception:
-        logger.exception("Failed to send digest to %s", msg.get("To"))
+    with pool, ThreadPoolExecutor(max_workers=pool.size) as workers:
+        sent = sum(workers.map(deliver, recipients, slices))
+    logger.info("Delivered %d/%d digests", sent, len(recipients))
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
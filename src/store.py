@@ -1,7 +1,13 @@
+import json
+import os
 import sqlite3
+from array import array
 from contextlib import closing
+from datetime import datetime, timezone
 from pathlib import Path
 
+import metrics
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS items (
   id TEXT PRIMARY KEY,
@@ -10,13 +16,211 @@ CREATE TABLE IF NOT EXISTS items (
   url TEXT,
   published TEXT,
     summary TEXT,
-    ai_summary TEXT
+    ai_summary TEXT,
+    published_ts INTEGER,
+    canonical_key TEXT
+);
+
+-- Every source an item was seen in; duplicates from other sources are attached here
+CREATE TABLE IF NOT EXISTS item_sources (
+  item_id TEXT,
+  source TEXT,
+  url TEXT,
+  PRIMARY KEY (item_id, source)
+);
+
+-- MinHash signature and LSH band buckets for near-duplicate lookups (see dedup.py)
+CREATE TABLE IF NOT EXISTS item_minhash (
+  item_id TEXT PRIMARY KEY,
+  signature BLOB
+);
+-- Row of each item in the memory-mapped ranking vectors file (see rank.py)
+CREATE TABLE IF NOT EXISTS item_vectors (
+  item_id TEXT PRIMARY KEY,
+  row INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS item_lsh (
+  bucket TEXT,
+  item_id TEXT,
+  PRIMARY KEY (bucket, item_id)
+) WITHOUT ROWID;
+
+-- HTTP validators and body hash from the last successful fetch of each source
+CREATE TABLE IF NOT EXISTS feed_cache (
+  source TEXT PRIMARY KEY,
+  url TEXT,
+  etag TEXT,
+  last_modified TEXT,
+  content_hash TEXT,
+  content_length INTEGER
+);
+
+-- Newest entry already processed per source, so collect can stop at known entries
+CREATE TABLE IF NOT EXISTS source_cursor (
+  source TEXT PRIMARY KEY,
+  published TEXT,
+  item_id TEXT
+);
+
+-- Progress of each source's arXiv backfill (see backfill.py): the requested window of
+-- days, the slice being paged and the offset of its next page
+CREATE TABLE IF NOT EXISTS backfill_cursor (
+  source TEXT PRIMARY KEY,
+  since TEXT,
+  until TEXT,
+  slice_end TEXT,
+  start INTEGER,
+  items INTEGER,
+  done INTEGER
+);
+
+-- Summarization work queue shared by concurrent summarize runs. A worker leases jobs
+-- until lease_expires; expired leases go back to the pool, and a job whose attempts
+-- reach the limit is parked as 'dead' instead of being retried forever.
+CREATE TABLE IF NOT EXISTS summary_jobs (
+  item_id TEXT PRIMARY KEY,
+  priority INTEGER,
+  state TEXT DEFAULT 'pending',
+  attempts INTEGER DEFAULT 0,
+  lease_owner TEXT,
+  lease_expires INTEGER,
+  last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_summary_jobs_claim ON summary_jobs(state, priority);
+
+-- Monthly cold-storage files written by archive.py: committed length, item count and
+-- newest published_ts, so a partially appended file can be truncated back
+CREATE TABLE IF NOT EXISTS archive_partitions (
+  month TEXT PRIMARY KEY,
+  bytes INTEGER,
+  items INTEGER,
+  max_ts INTEGER
+);
+
+-- Canonical key of every archived item, so dedup still recognizes papers that left the
+-- hot DB (see archive.py)
+CREATE TABLE IF NOT EXISTS archived_keys (
+  canonical_key TEXT PRIMARY KEY,
+  item_id TEXT,
+  month TEXT
+);
+
+-- Rendered output fragments per item, reused while the item's content hash is unchanged
+CREATE TABLE IF NOT EXISTS render_cache (
+  kind TEXT,
+  item_id TEXT,
+  content_hash TEXT,
+  fragment TEXT,
+  PRIMARY KEY (kind, item_id)
 );
 """
 
+# Full-text index over items, external-content so the text is stored only once. It is
+# keyed by the items rowid, which VACUUM may renumber: call rebuild_search_index after one.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+  title, summary, ai_summary, content='items', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+  INSERT INTO items_fts (rowid, title, summary, ai_summary) VALUES (new.rowid, new.title, new.summary, new.ai_summary);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+  INSERT INTO items_fts (items_fts, rowid, title, summary, ai_summary)
+  VALUES ('delete', old.rowid, old.title, old.summary, old.ai_summary);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF title, summary, ai_summary ON items BEGIN
+  INSERT INTO items_fts (items_fts, rowid, title, summary, ai_summary)
+  VALUES ('delete', old.rowid, old.title, old.summary, old.ai_summary);
+  INSERT INTO items_fts (rowid, title, summary, ai_summary) VALUES (new.rowid, new.title, new.summary, new.ai_summary);
+END;
+"""
+
+ITEM_COLUMNS = "id, source, title, url, published, summary, ai_summary, published_ts"
+
+# Bumped whenever _migrate learns a new step; stored in PRAGMA user_version
+SCHEMA_VERSION = 6
+
+
+def to_epoch(value) -> int | None:
+    """Convert a stored ISO timestamp (or epoch seconds) into integer UTC epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        # Free-form dates from older rows; dateutil is only needed on this slow path
+        from dateutil import parser as dtparser
+
+        try:
+            dt = dtparser.parse(value)
+        except Exception:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _migrate(conn):
+    """Bring an existing DB up to SCHEMA_VERSION."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    cur = conn.cursor()
+    cur.execute("PRAGMA table_info(items)")
+    cols = [r[1] for r in cur.fetchall()]
+    if version < 1:
+        # Ensure ai_summary column exists for older DBs
+        if "ai_summary" not in cols:
+            cur.execute("ALTER TABLE items ADD COLUMN ai_summary TEXT DEFAULT ''")
+        if "published_ts" not in cols:
+            cur.execute("ALTER TABLE items ADD COLUMN published_ts INTEGER")
+        rows = cur.execute(
+            "SELECT id, published FROM items WHERE published_ts IS NULL AND published IS NOT NULL AND published != ''"
+        ).fetchall()
+        cur.executemany(
+            "UPDATE items SET published_ts = ? WHERE id = ?",
+            ((ts, item_id) for item_id, ts in ((r[0], to_epoch(r[1])) for r in rows) if ts is not None),
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_items_published_ts ON items(published_ts)")
+    if version < 2:
+        if "canonical_key" not in cols:
+            cur.execute("ALTER TABLE items ADD COLUMN canonical_key TEXT")
+        conn.commit()
+        # Merges the cross-listed and re-versioned papers stored before dedup existed
+        from dedup import backfill
+
+        backfill(conn)
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_canonical_key ON items(canonical_key)")
+    if version < 3:
+        conn.executescript(SEARCH_SCHEMA)
+        rebuild_search_index(conn)
+    if version < 4:
+        conn.commit()
+        # Keys of the items archived before archived_keys existed
+        from archive import index_archived_keys
+
+        index_archived_keys(conn)
+    if version < 5:
+        # build_site.py once cached every week's search entries here, archived weeks too
+        cur.execute("DELETE FROM render_cache WHERE kind = 'site-search'")
+    if version < 6:
+        conn.commit()
+        # Anchors, ref/source parameters and items without a link got keys of their own
+        from archive import index_archived_keys
+        from dedup import rekey
+
+        rekey(conn)
+        cur.execute("DELETE FROM archived_keys")
+        index_archived_keys(conn)
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
 
 def connect(db_path: str | None = None):
-    """Connect to the SQLite DB. If db_path is None, use the repository's data/items.sqlite
+    """Connect to the SQLite DB. If db_path is None, use $AI_DIGEST_DB or the repository's data/items.sqlite
 
     The function ensures the data directory exists and returns a live connection with the
     table schema applied.
@@ -26,44 +230,660 @@ def connect(db_path: str | None = None):
     data_dir = base / "data"
     data_dir.mkdir(parents=True, exist_ok=True)
 
+    db_path = db_path or os.environ.get("AI_DIGEST_DB")
     db_file = Path(db_path) if db_path else data_dir / "items.sqlite"
     conn = sqlite3.connect(str(db_file))
-    conn.execute(SCHEMA)
-    # Ensure ai_summary column exists for older DBs
-    cur = conn.cursor()
-    cur.execute("PRAGMA table_info(items)")
-    cols = [r[1] for r in cur.fetchall()]
-    if "ai_summary" not in cols:
-        cur.execute("ALTER TABLE items ADD COLUMN ai_summary TEXT DEFAULT ''")
-        conn.commit()
+    # WAL lets readers run alongside a writer and, with synchronous=NORMAL, only fsyncs
+    # at checkpoints instead of on every commit.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
     return conn
 
 
+def _index_rows(cur, items):
+    # Own source row plus MinHash/LSH rows for items that carry a signature
+    cur.executemany(
+        "INSERT OR IGNORE INTO item_sources (item_id, source, url) VALUES (?,?,?)",
+        ((it["id"], it["source"], it["url"]) for it in items),
+    )
+    signed = [it for it in items if it.get("minhash") is not None]
+    cur.executemany(
+        "INSERT OR REPLACE INTO item_minhash (item_id, signature) VALUES (?,?)",
+        ((it["id"], array("Q", it["minhash"]).tobytes()) for it in signed),
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO item_lsh (bucket, item_id) VALUES (?,?)",
+        ((bucket, it["id"]) for it in signed for bucket in it["lsh_buckets"]),
+    )
+
+
+def _insert_items(cur, items):
+    cur.executemany(
+        "INSERT OR IGNORE INTO items (id, source, title, url, published, summary, published_ts, canonical_key) "
+        "VALUES (?,?,?,?,?,?,?,?)",
+        (
+            (
+                it["id"],
+                it["source"],
+                it["title"],
+                it["url"],
+                it.get("published", ""),
+                it.get("summary", ""),
+                it["published_ts"] if it.get("published_ts") is not None else to_epoch(it.get("published")),
+                it.get("canonical_key"),
+            )
+            for it in items
+        ),
+    )
+    _index_rows(cur, items)
+
+
 def upsert_items(conn, items):
+    items = list(items)
+    with metrics.timer("db_write_seconds", op="upsert_items"), closing(conn.cursor()) as cur:
+        _insert_items(cur, items)
+        conn.commit()
+
+
+def save_collected(conn, items, duplicates=(), caches=None, cursors=None):
+    """Store one flush of collect output in a single transaction.
+
+    ``items`` are inserted as ``upsert_items`` does and ``duplicates`` attached as
+    ``attach_sources`` does. ``caches`` (``{source: entry}``) replace the sources'
+    ``feed_cache`` rows and ``cursors`` (``{source: (published_iso, item_id)}``) their
+    ``source_cursor`` rows. A source's validators and cursor therefore never land without
+    the items they cover.
+    """
+    items = list(items)
+    with metrics.timer("db_write_seconds", op="save_collected"), closing(conn.cursor()) as cur:
+        try:
+            _insert_items(cur, items)
+            _attach(cur, list(duplicates))
+            for source, entry in (caches or {}).items():
+                _put_feed_cache(cur, source, entry)
+            for source, (published, item_id) in (cursors or {}).items():
+                _put_cursor(cur, source, published, item_id)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def index_items(conn, items):
+    """Set ``canonical_key`` and the dedup index rows for items that are already stored."""
     with closing(conn.cursor()) as cur:
-        for it in items:
-            cur.execute(
-                "INSERT OR IGNORE INTO items (id, source, title, url, published, summary) VALUES (?,?,?,?,?,?)",
-                (it["id"], it["source"], it["title"], it["url"], it.get("published", ""), it.get("summary", "")),
+        cur.executemany(
+            "UPDATE items SET canonical_key = ? WHERE id = ?", ((it["canonical_key"], it["id"]) for it in items)
+        )
+        _index_rows(cur, items)
+        conn.commit()
+
+
+def find_canonical_ids(conn, keys) -> dict[str, str]:
+    """Return ``{canonical_key: item_id}`` for the keys that are already stored."""
+    keys = list(keys)
+    rows = conn.execute(
+        "SELECT canonical_key, id FROM items WHERE canonical_key IN (SELECT value FROM json_each(?))",
+        (json.dumps(keys),),
+    ).fetchall()
+    return dict(rows)
+
+
+def find_archived_ids(conn, keys) -> dict[str, str]:
+    """Return ``{canonical_key: item_id}`` for the keys of archived items."""
+    rows = conn.execute(
+        "SELECT canonical_key, item_id FROM archived_keys WHERE canonical_key IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(keys)),),
+    ).fetchall()
+    return dict(rows)
+
+
+def add_archived_keys(conn, keys):
+    """Record ``(canonical_key, item_id, month)`` rows for items in the cold partitions."""
+    with closing(conn.cursor()) as cur:
+        cur.executemany("INSERT OR IGNORE INTO archived_keys (canonical_key, item_id, month) VALUES (?,?,?)", keys)
+        conn.commit()
+
+
+def lsh_candidates(conn, buckets) -> set[str]:
+    rows = conn.execute(
+        "SELECT DISTINCT item_id FROM item_lsh WHERE bucket IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(buckets)),),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def get_signatures(conn, item_ids) -> dict[str, tuple[int, ...]]:
+    rows = conn.execute(
+        "SELECT item_id, signature FROM item_minhash WHERE item_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(item_ids)),),
+    ).fetchall()
+    return {r[0]: tuple(array("Q", r[1])) for r in rows}
+
+
+def get_vector_rows(conn, item_ids) -> dict[str, int]:
+    """Return ``{item_id: row}`` for the items that already have a ranking vector."""
+    rows = conn.execute(
+        "SELECT item_id, row FROM item_vectors WHERE item_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(item_ids)),),
+    ).fetchall()
+    return dict(rows)
+
+
+def vector_row_count(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM item_vectors").fetchone()[0]
+
+
+def add_vector_rows(conn, pairs):
+    """Record ``(item_id, row)`` pairs once their vectors are on disk."""
+    with closing(conn.cursor()) as cur:
+        cur.executemany("INSERT OR REPLACE INTO item_vectors (item_id, row) VALUES (?,?)", pairs)
+        conn.commit()
+
+
+def list_vector_rows(conn) -> list[tuple[str, int]]:
+    """Every ``(item_id, row)`` in item_vectors, in file order."""
+    return conn.execute("SELECT item_id, row FROM item_vectors ORDER BY row").fetchall()
+
+
+def replace_vector_rows(conn, pairs):
+    """Swap the whole item_vectors table for ``pairs`` in one transaction."""
+    with closing(conn.cursor()) as cur:
+        try:
+            cur.execute("DELETE FROM item_vectors")
+            cur.executemany("INSERT INTO item_vectors (item_id, row) VALUES (?,?)", pairs)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def clear_vector_rows(conn):
+    conn.execute("DELETE FROM item_vectors")
+    conn.commit()
+
+
+def items_without_vectors(conn, limit: int | None = None):
+    """``(id, title, summary)`` of stored items that have no ranking vector yet, oldest first."""
+    sql = (
+        "SELECT id, title, summary FROM items WHERE id NOT IN (SELECT item_id FROM item_vectors) "
+        "ORDER BY published_ts, rowid"
+    )
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return conn.execute(sql).fetchall()
+
+
+def _attach(cur, rows):
+    if not rows:
+        return
+    cur.executemany("INSERT OR IGNORE INTO item_sources (item_id, source, url) VALUES (?,?,?)", rows)
+    cur.executemany(
+        "UPDATE items SET source = ("
+        "SELECT group_concat(source, ', ') FROM (SELECT source FROM item_sources WHERE item_id = ? ORDER BY source)"
+        ") WHERE id = ?",
+        ((item_id, item_id) for item_id in {r[0] for r in rows}),
+    )
+
+
+def attach_sources(conn, rows):
+    """Record ``(item_id, source, url)`` sightings and list every source in ``items.source``."""
+    with closing(conn.cursor()) as cur:
+        _attach(cur, list(rows))
+        conn.commit()
+
+
+def remove_items(conn, item_ids):
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+    with closing(conn.cursor()) as cur:
+        ids = json.dumps(item_ids)
+        cur.execute("DELETE FROM items WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+        for table in ("item_sources", "item_minhash", "item_lsh", "item_vectors", "summary_jobs"):
+            cur.execute(f"DELETE FROM {table} WHERE item_id IN (SELECT value FROM json_each(?))", (ids,))
+        conn.commit()
+
+
+def items_published_before(conn, ts: int):
+    """``ITEM_COLUMNS`` plus ``canonical_key`` of dated items older than ``ts``, oldest first."""
+    return conn.execute(
+        f"SELECT {ITEM_COLUMNS}, canonical_key FROM items WHERE published_ts < ? ORDER BY published_ts, id",
+        (ts,),
+    ).fetchall()
+
+
+def get_item_sources(conn, item_ids) -> dict[str, list[tuple[str, str]]]:
+    rows = conn.execute(
+        "SELECT item_id, source, url FROM item_sources WHERE item_id IN (SELECT value FROM json_each(?)) "
+        "ORDER BY item_id, source",
+        (json.dumps(list(item_ids)),),
+    ).fetchall()
+    out: dict[str, list[tuple[str, str]]] = {}
+    for item_id, source, url in rows:
+        out.setdefault(item_id, []).append((source, url))
+    return out
+
+
+def get_archive_partitions(conn) -> dict[str, tuple[int, int, int]]:
+    """``{month: (bytes, items, max_ts)}`` for every partition archive.py has committed."""
+    rows = conn.execute("SELECT month, bytes, items, max_ts FROM archive_partitions").fetchall()
+    return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+
+def save_archived(conn, item_ids, partitions, keys=()):
+    """Drop archived items from the hot DB and record the partitions that now hold them.
+
+    ``partitions`` is ``{month: (bytes, items, max_ts)}`` and ``keys`` the items'
+    ``(canonical_key, item_id, month)`` rows for ``archived_keys``. All of it happens in
+    one transaction, so the items leave the DB exactly when their partition length is known.
+    """
+    item_ids = list(item_ids)
+    ids = json.dumps(item_ids)
+    with metrics.timer("db_write_seconds", op="save_archived"), closing(conn.cursor()) as cur:
+        try:
+            cur.execute("DELETE FROM items WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            for table in ("item_sources", "item_minhash", "item_lsh", "item_vectors", "summary_jobs", "render_cache"):
+                cur.execute(f"DELETE FROM {table} WHERE item_id IN (SELECT value FROM json_each(?))", (ids,))
+            cur.executemany(
+                "INSERT OR REPLACE INTO archive_partitions (month, bytes, items, max_ts) VALUES (?,?,?,?)",
+                ((month, *info) for month, info in partitions.items()),
+            )
+            cur.executemany(
+                "INSERT OR IGNORE INTO archived_keys (canonical_key, item_id, month) VALUES (?,?,?)",
+                (k for k in keys if k[0]),
             )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def restore_items(conn, records):
+    """Insert complete item dicts (as archive.py writes them), with their ``sources`` links."""
+    records = list(records)
+    with closing(conn.cursor()) as cur:
+        cur.executemany(
+            "INSERT OR IGNORE INTO items (id, source, title, url, published, summary, ai_summary, published_ts, "
+            "canonical_key) VALUES (:id, :source, :title, :url, :published, :summary, :ai_summary, :published_ts, "
+            ":canonical_key)",
+            records,
+        )
+        # ``source`` already lists every sighting, so only the links themselves are needed
+        cur.executemany(
+            "INSERT OR IGNORE INTO item_sources (item_id, source, url) VALUES (?,?,?)",
+            ((rec["id"], source, url) for rec in records for source, url in rec.get("sources") or []),
+        )
+        conn.commit()
+
+
+def rebuild_search_index(conn):
+    """Re-index items_fts from the items table."""
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
     conn.commit()
 
 
-def recent_items(conn, since_iso):
+# A topic search with a ``limit`` or ``since`` walks published_ts newest first and
+# matches each chunk of rows on its own; past this many rows it uses items_fts instead
+SCAN_LIMIT = 20000
+_SCAN_CHUNK = 1000
+
+
+class _ChunkMatcher:
+    """FTS5 queries evaluated against a few rows in a private in-memory index.
+
+    items_fts answers a prefix query by merging the doclists of every expanded term
+    over the whole table, so its cost grows with the history. Rows reached by an index
+    walk are matched here instead, with the same columns and tokenizer.
+    """
+
+    def __init__(self):
+        self.mem = sqlite3.connect(":memory:", isolation_level=None)
+        self.mem.execute("CREATE VIRTUAL TABLE chunk USING fts5(title, summary, ai_summary)")
+
+    def match(self, queries, rows) -> dict[str, set[int]]:
+        """``{query: rowids}`` for ``(rowid, title, summary, ai_summary)`` rows."""
+        # One transaction, so the chunk is flushed as a single index segment
+        self.mem.execute("BEGIN")
+        self.mem.execute("DELETE FROM chunk")
+        self.mem.executemany("INSERT INTO chunk (rowid, title, summary, ai_summary) VALUES (?,?,?,?)", rows)
+        self.mem.execute("COMMIT")
+        find = "SELECT rowid FROM chunk WHERE chunk MATCH ?"
+        return {q: {r[0] for r in self.mem.execute(find, (q,))} for q in queries}
+
+    def close(self):
+        self.mem.close()
+
+
+def _walk_topics(conn, topics: dict, where: list[str], params: list, limit: int | None):
+    """Topic matches among the rows ``where`` selects, newest first; None past SCAN_LIMIT rows."""
+    sql = f"SELECT rowid, {ITEM_COLUMNS} FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY published_ts DESC"
+    matcher = _ChunkMatcher()
+    out, seen = [], 0
+    try:
+        with closing(conn.execute(sql, params)) as cur:
+            while limit is None or len(out) < limit:
+                chunk = cur.fetchmany(_SCAN_CHUNK)
+                if not chunk:
+                    break
+                seen += len(chunk)
+                if seen > SCAN_LIMIT:
+                    return None
+                hits = matcher.match(topics, [(r[0], r[3], r[6], r[7]) for r in chunk])
+                restricted = {q: set(s) for q, s in topics.items() if s}
+                seen_in = get_item_sources(conn, [r[1] for r in chunk]) if restricted else {}
+                for r in chunk:
+                    for query, sources in topics.items():
+                        if r[0] not in hits[query]:
+                            continue
+                        if sources and not restricted[query].intersection(s for s, _ in seen_in.get(r[1], ())):
+                            continue
+                        out.append(r[1:])
+                        break
+                # A rare topic would need most of the table; items_fts is cheaper then
+                if limit is not None and len(out) < limit and seen * limit > SCAN_LIMIT * max(len(out), 1):
+                    return None
+    finally:
+        matcher.close()
+    return out[:limit] if limit is not None else out
+
+
+def _topic_clause(topics) -> tuple[str, list]:
+    # One FTS query for all items, or an OR of (query, restricted to these sources) groups
+    if isinstance(topics, str):
+        topics = {topics: None}
+    clauses, params = [], []
+    for query, sources in topics.items():
+        clause = "rowid IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)"
+        params.append(query)
+        if sources:
+            clause += (
+                " AND id IN (SELECT item_id FROM item_sources WHERE source IN (SELECT value FROM json_each(?)))"
+            )
+            params.append(json.dumps(list(sources)))
+        clauses.append(f"({clause})")
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def search_items(conn, topics=None, since=None, limit: int | None = None, unsummarized: bool = False):
+    """Items matching an FTS5 query, newest first, as ``ITEM_COLUMNS`` tuples.
+
+    ``topics`` is a query string, or a ``{query: sources}`` mapping as built by
+    ``matcher.topic_queries`` (a source list of None means all sources); None matches
+    everything. ``since`` is an ISO string or epoch seconds.
+
+    With a ``limit`` or ``since``, the published_ts index drives the query and topics are
+    checked on the rows it reaches (see ``_walk_topics``), so the cost follows the rows
+    read rather than the size of the table.
+    """
+    where, params = [], []
+    if since is not None:
+        where.append("published_ts >= ?")
+        params.append(to_epoch(since))
+    if unsummarized:
+        where.append("(ai_summary IS NULL OR ai_summary = '')")
+    if topics and (limit is not None or since is not None):
+        topics = {topics: None} if isinstance(topics, str) else topics
+        window = SCAN_LIMIT
+        if limit is None:
+            window = conn.execute("SELECT COUNT(*) FROM items WHERE published_ts >= ?", (to_epoch(since),))
+            window = window.fetchone()[0]
+        if window <= SCAN_LIMIT:
+            with metrics.timer("db_read_seconds", op="search_items"):
+                rows = _walk_topics(conn, topics, where, params, limit)
+            if rows is not None:
+                return rows
+    if topics:
+        clause, topic_params = _topic_clause(topics)
+        where.insert(0, clause)
+        params[:0] = topic_params
+    sql = f"SELECT {ITEM_COLUMNS} FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY published_ts DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with metrics.timer("db_read_seconds", op="search_items"):
+        return conn.execute(sql, params).fetchall()
+
+
+def filter_items(conn, item_ids, match: str | None = None, exclude: str | None = None, sources=None) -> set[str]:
+    """The ``item_ids`` that match the FTS5 query ``match``, not ``exclude``, seen in ``sources``.
+
+    Each filter left as None is not applied. The queries are matched against just these
+    rows (see ``_ChunkMatcher``), not against items_fts as a whole.
+    """
+    where, params = ["id IN (SELECT value FROM json_each(?))"], [json.dumps(list(item_ids))]
+    if sources:
+        where.append("id IN (SELECT item_id FROM item_sources WHERE source IN (SELECT value FROM json_each(?)))")
+        params.append(json.dumps(list(sources)))
+    with metrics.timer("db_read_seconds", op="filter_items"):
+        sql = f"SELECT rowid, id, title, summary, ai_summary FROM items WHERE {' AND '.join(where)}"
+        rows = conn.execute(sql, params).fetchall()
+        queries = [q for q in (match, exclude) if q]
+        if not queries:
+            return {r[1] for r in rows}
+        matcher = _ChunkMatcher()
+        try:
+            hits = matcher.match(queries, [(r[0], r[2], r[3], r[4]) for r in rows])
+        finally:
+            matcher.close()
+    return {
+        r[1]
+        for r in rows
+        if (not match or r[0] in hits[match]) and (not exclude or r[0] not in hits[exclude])
+    }
+
+
+def get_items(conn, item_ids):
+    """``ITEM_COLUMNS`` rows for ``item_ids``, in no particular order."""
+    return conn.execute(
+        f"SELECT {ITEM_COLUMNS} FROM items WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(item_ids)),),
+    ).fetchall()
+
+
+def enqueue_summary_jobs(conn, jobs):
+    """Queue ``(item_id, priority)`` pairs for unsummarized items.
+
+    Pending, leased and dead jobs are left as they are. A done job is reopened, since
+    being passed here means its summary was cleared.
+    """
+    with closing(conn.cursor()) as cur:
+        cur.executemany(
+            "INSERT INTO summary_jobs (item_id, priority) VALUES (?,?) ON CONFLICT(item_id) DO UPDATE SET "
+            "state = 'pending', attempts = 0, priority = excluded.priority WHERE state = 'done'",
+            jobs,
+        )
+        conn.commit()
+
+
+def claim_summary_jobs(conn, owner: str, limit: int, lease_seconds: int, max_attempts: int, now: int | None = None):
+    """Lease up to ``limit`` jobs to ``owner``, highest priority first; returns their item ids.
+
+    A job is free when pending or when its lease has expired. A claim counts as an
+    attempt, so a job that keeps killing its worker is marked dead once an expired lease
+    has used up ``max_attempts``. The claim runs under BEGIN IMMEDIATE: two processes
+    cannot select the same free job.
+    """
+    now = int(now if now is not None else datetime.now(timezone.utc).timestamp())
+    with metrics.timer("db_write_seconds", op="claim_summary_jobs"):
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE summary_jobs SET state = 'dead', lease_owner = NULL, "
+                "last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, max_attempts),
+            )
+            rows = conn.execute(
+                "UPDATE summary_jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1 "
+                "WHERE item_id IN ("
+                "  SELECT item_id FROM summary_jobs"
+                "  WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)"
+                "  ORDER BY priority DESC LIMIT ?"
+                ") RETURNING item_id",
+                (owner, now + lease_seconds, now, limit),
+            ).fetchall()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return [r[0] for r in rows]
+
+
+def complete_summary_jobs(conn, summaries):
+    """Store ``(item_id, ai_summary)`` pairs and mark their jobs done, in one transaction."""
+    summaries = list(summaries)
+    with metrics.timer("db_write_seconds", op="complete_summary_jobs"), closing(conn.cursor()) as cur:
+        cur.executemany("UPDATE items SET ai_summary = ? WHERE id = ?", ((s, i) for i, s in summaries))
+        cur.executemany(
+            "UPDATE summary_jobs SET state = 'done', lease_owner = NULL, last_error = NULL WHERE item_id = ?",
+            ((i,) for i, _ in summaries),
+        )
+        conn.commit()
+
+
+def fail_summary_jobs(conn, item_ids, error: str, max_attempts: int):
+    """Release failed jobs for a retry, or mark them dead once ``max_attempts`` are used."""
+    with closing(conn.cursor()) as cur:
+        cur.executemany(
+            "UPDATE summary_jobs SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+            "lease_owner = NULL, lease_expires = NULL, last_error = ? WHERE item_id = ?",
+            ((max_attempts, error, i) for i in item_ids),
+        )
+        conn.commit()
+
+
+def drop_summary_jobs(conn, item_ids):
+    """Delete the jobs of items that no longer exist (archived or merged after enqueue)."""
+    with closing(conn.cursor()) as cur:
+        cur.execute(
+            "DELETE FROM summary_jobs WHERE item_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(item_ids)),),
+        )
+        conn.commit()
+
+
+def summary_job_counts(conn) -> dict[str, int]:
+    return dict(conn.execute("SELECT state, COUNT(*) FROM summary_jobs GROUP BY state").fetchall())
+
+
+def get_feed_cache(conn) -> dict[str, dict]:
+    """Return the stored fetch validators keyed by source name."""
     cur = conn.cursor()
-    return cur.execute(
-        "SELECT source, title, url, published, summary, ai_summary "
-        "FROM items "
-        "WHERE published >= ? "
-        "ORDER BY published DESC",
-        (since_iso,),
+    rows = cur.execute(
+        "SELECT source, url, etag, last_modified, content_hash, content_length FROM feed_cache"
     ).fetchall()
+    return {
+        r[0]: {
+            "url": r[1],
+            "etag": r[2],
+            "last_modified": r[3],
+            "content_hash": r[4],
+            "content_length": r[5] or 0,
+        }
+        for r in rows
+    }
 
 
-def set_ai_summary(conn, item_id: str, ai_summary: str):
+def _put_feed_cache(cur, source: str, entry: dict):
+    cur.execute(
+        "INSERT OR REPLACE INTO feed_cache (source, url, etag, last_modified, content_hash, content_length) "
+        "VALUES (?,?,?,?,?,?)",
+        (
+            source,
+            entry.get("url"),
+            entry.get("etag"),
+            entry.get("last_modified"),
+            entry.get("content_hash"),
+            entry.get("content_length", 0),
+        ),
+    )
+
+
+def get_source_cursors(conn) -> dict[str, tuple[str, str]]:
+    """Return ``{source: (published_iso, item_id)}`` for the newest entry seen per source."""
     cur = conn.cursor()
+    rows = cur.execute("SELECT source, published, item_id FROM source_cursor").fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def _put_cursor(cur, source: str, published: str, item_id: str):
     cur.execute(
-        "UPDATE items SET ai_summary = ? WHERE id = ?",
-        (ai_summary, item_id),
+        "INSERT OR REPLACE INTO source_cursor (source, published, item_id) VALUES (?,?,?)",
+        (source, published, item_id),
     )
-    conn.commit()
+
+
+def get_backfill_cursors(conn) -> dict[str, dict]:
+    """Return ``{source: cursor}``; see ``save_backfill_page`` for the cursor keys."""
+    rows = conn.execute("SELECT source, since, until, slice_end, start, items, done FROM backfill_cursor").fetchall()
+    return {
+        r[0]: {"since": r[1], "until": r[2], "slice_end": r[3], "start": r[4], "items": r[5] or 0, "done": bool(r[6])}
+        for r in rows
+    }
+
+
+def save_backfill_page(conn, source: str, items, duplicates=(), cursor: dict | None = None):
+    """Store one backfilled page and the source's next position in a single transaction.
+
+    ``cursor`` has ``since``, ``until`` and ``slice_end`` (``YYYYMMDD``), the ``start``
+    offset of the next page, the running ``items`` count and ``done``.
+    """
+    items = list(items)
+    with metrics.timer("db_write_seconds", op="save_backfill_page"), closing(conn.cursor()) as cur:
+        try:
+            _insert_items(cur, items)
+            _attach(cur, list(duplicates))
+            if cursor is not None:
+                cur.execute(
+                    "INSERT OR REPLACE INTO backfill_cursor (source, since, until, slice_end, start, items, done) "
+                    "VALUES (?,?,?,?,?,?,?)",
+                    (
+                        source,
+                        cursor["since"],
+                        cursor["until"],
+                        cursor["slice_end"],
+                        cursor["start"],
+                        cursor["items"],
+                        int(cursor["done"]),
+                    ),
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def get_fragments(conn, kind: str) -> dict[str, tuple[str, str]]:
+    """Return ``{item_id: (content_hash, fragment)}`` for one kind of rendered output."""
+    cur = conn.cursor()
+    rows = cur.execute("SELECT item_id, content_hash, fragment FROM render_cache WHERE kind = ?", (kind,)).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def set_fragments(conn, kind: str, fragments, keep_ids=None):
+    """Store ``(item_id, content_hash, fragment)`` rows; drop cached rows not in ``keep_ids``."""
+    with metrics.timer("db_write_seconds", op="set_fragments"), closing(conn.cursor()) as cur:
+        cur.executemany(
+            "INSERT OR REPLACE INTO render_cache (kind, item_id, content_hash, fragment) VALUES (?,?,?,?)",
+            ((kind, item_id, content_hash, fragment) for item_id, content_hash, fragment in fragments),
+        )
+        if keep_ids is not None:
+            keep = list(keep_ids)
+            cur.execute(
+                "DELETE FROM render_cache WHERE kind = ? AND item_id NOT IN (SELECT value FROM json_each(?))",
+                (kind, json.dumps(keep)),
+            )
+        conn.commit()
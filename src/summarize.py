@@ -1,13 +1,42 @@
 import re
 import logging
 import os
+import socket
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from store import connect, set_ai_summary
-from llm import summarize_with_gemini, ITEM_PROMPT, DIGEST_PROMPT
+import metrics
+from config import topics
+from store import (
+    claim_summary_jobs,
+    complete_summary_jobs,
+    connect,
+    drop_summary_jobs,
+    enqueue_summary_jobs,
+    fail_summary_jobs,
+    get_items,
+    search_items,
+    summary_job_counts,
+)
+from llm import (
+    BudgetExhausted,
+    compact_abstract,
+    estimate_tokens,
+    get_budget,
+    summarize_with_gemini,
+    summarize_batch_with_gemini,
+    log_budget_stats,
+    log_cache_stats,
+    ITEM_PROMPT,
+    DIGEST_PROMPT,
+    CHUNK_PROMPT,
+    REDUCE_PROMPT,
+)
 
 logger = logging.getLogger(__name__)
 
-
 _sentence_split_re = re.compile(r"(?<=[.!?])\s+")
 
 
@@ -38,64 +67,278 @@ def summarize_text(text: str, max_sentences: int = 2, max_chars: int = 400) -> s
     return summary
 
 
+def chunk_texts(texts: list[str], max_chars: int) -> list[list[str]]:
+    """Group ``texts`` in order into chunks of at most ``max_chars`` characters.
+
+    Besides the size cap, a chunk ends after any text whose hash marks a boundary (once
+    the chunk is a quarter full). Boundaries therefore follow content, not position:
+    adding items to a week reshapes only the chunks they land in, and the other chunks
+    keep their exact text and hit the response cache.
+    """
+    chunks, current, size = [], [], 0
+    for text in texts:
+        if current and size + len(text) > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 2
+        if size >= max_chars // 4 and zlib.crc32(text.encode("utf-8")) % 8 == 0:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _spread(partials: list[str], max_sentences: int, max_chars: int) -> str:
+    # Extractive reduce: lead sentences taken evenly across all partials, not just the first
+    leads = [_sentence_split_re.split(p, 1)[0] for p in partials if p]
+    step = max(1, len(leads) / max_sentences)
+    picked = [leads[int(i * step)] for i in range(min(max_sentences, len(leads)))]
+    return summarize_text(" ".join(picked), max_sentences=max_sentences, max_chars=max_chars)
+
+
 def digest_summary(texts: list[str], max_sentences: int = 3, max_chars: int = 800) -> str:
     """Build an overall digest summary from a list of per-item summary strings.
 
-    Tries Gemini first (if USE_GEMINI is set), falls back to extractive.
+    Every text is used. A week that fits in DIGEST_CHUNK_CHARS (default 6000) is
+    summarized in one call. A larger week is map-reduced: each chunk from
+    ``chunk_texts`` is summarized concurrently (through the shared rate limiter and
+    response cache), then the partial summaries are reduced into the overview, chunking
+    again if they are still too long. Tries Gemini first (if USE_GEMINI is set), falls
+    back to extractive.
     """
+    texts = [t for t in texts if t]
     if not texts:
         return ""
-    concat = "\n\n".join(texts[:20])
+    chunk_chars = max(1000, int(os.environ.get("DIGEST_CHUNK_CHARS", "6000")))
     use_gemini = os.environ.get("USE_GEMINI", "0") in ("1", "true", "True")
     if use_gemini:
         try:
-            return summarize_with_gemini(concat, max_tokens=200, system_prompt=DIGEST_PROMPT)
+            return _reduce_with_gemini(texts, chunk_chars)
+        except BudgetExhausted as ex:
+            logger.info("Digest summary is extractive: %s", ex)
         except Exception:
             logger.exception("Gemini digest summary failed, falling back to extractive")
-    return summarize_text(concat, max_sentences=max_sentences, max_chars=max_chars)
+    chunks = chunk_texts(texts, chunk_chars)
+    if len(chunks) == 1:
+        return summarize_text("\n\n".join(texts), max_sentences=max_sentences, max_chars=max_chars)
+    from extractive import summarize_many
+
+    partials = summarize_many(["\n\n".join(c) for c in chunks], max_sentences=1)
+    return _spread(partials, max_sentences, max_chars)
+
+
+def _reduce_with_gemini(texts: list[str], chunk_chars: int) -> str:
+    prompt = DIGEST_PROMPT
+    level = 0
+    while True:
+        chunks = chunk_texts(texts, chunk_chars)
+        # Stop once chunking no longer shrinks the input (e.g. partials longer than a chunk)
+        if len(chunks) == 1 or len(chunks) >= len(texts):
+            return summarize_with_gemini("\n\n".join(texts), max_tokens=200, system_prompt=prompt)
+        workers = max(1, int(os.environ.get("SUMMARIZE_WORKERS", "4")))
+        logger.info("Digest level %d: %d texts in %d chunks", level, len(texts), len(chunks))
+        metrics.inc("digest_chunks_total", len(chunks), level=level)
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            texts = list(
+                pool.map(
+                    lambda c: summarize_with_gemini("\n\n".join(c), max_tokens=200, system_prompt=CHUNK_PROMPT),
+                    chunks,
+                )
+            )
+        prompt = REDUCE_PROMPT
+        level += 1
 
 
-def main(dry_run: bool = False):
+def overview(ai_summaries: list[str], summaries: list[str]) -> str:
+    """Digest overview from per-item AI summaries, or from the abstracts if none exist yet."""
+    texts = [t for t in ai_summaries if t]
+    if not texts:
+        texts = [t for t in summaries if t]
+    return digest_summary(texts)
+
+
+def week_overview(conn, cfg: dict | None = None) -> str:
+    """The digest overview: on-topic items of the last 7 days, as the feed and email use it."""
+    since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    rows = search_items(conn, topics(cfg), since=since)
+    return overview([r[6] for r in rows], [r[5] for r in rows])
+
+
+def main(dry_run: bool = False, conn=None):
+    """Summarize on-topic items that have no ai_summary yet, through the summary_jobs queue.
+
+    Every run queues the unsummarized items it finds, newest first. It then works through
+    leased chunks of SUMMARIZE_CLAIM jobs until none are free. Several runs (or machines
+    sharing the DB) can do this at once without summarizing an item twice. A chunk not
+    finished within SUMMARY_LEASE_SECONDS (default 900) is handed to another worker. An
+    item that fails SUMMARY_MAX_ATTEMPTS times (default 3) is marked dead and skipped.
+
+    Abstracts are compacted before they are sent (see ``llm.compact_abstract``) and cut
+    to LLM_MAX_INPUT_TOKENS. Once the run's LLM budget cannot cover the next request,
+    the remaining, older items get extractive summaries instead.
+    """
     logging.basicConfig(level=logging.INFO)
-    conn = connect()
-    cur = conn.cursor()
-    # Select items that don't yet have an ai_summary (NULL or empty)
-    rows = cur.execute(
-        "SELECT id, title, summary, url FROM items WHERE ai_summary IS NULL OR ai_summary = ''"
-    ).fetchall()
-
-    if not rows:
-        print("No items to summarize.")
-        return
+    conn = conn or connect()
+    # Items on topic that don't yet have an ai_summary (NULL or empty); collect stores
+    # everything, but only the entries the topic query selects are worth an LLM call.
+    found = search_items(conn, topics(), unsummarized=True)
 
-    print(f"Generating summaries for {len(rows)} items...")
-    for item_id, title, summary, url in rows:
-        source_text = summary or title or url or ""
-        use_gemini = os.environ.get("USE_GEMINI", "0") in ("1", "true", "True")
-        s = ""
-        if use_gemini:
-            try:
-                # Use the configured Google Gemini (or other) LLM endpoint. The implementation
-                # reads credentials and endpoint from environment variables. We will fall back
-                # to the local extractive summarizer on any error.
-                s = summarize_with_gemini(source_text, system_prompt=ITEM_PROMPT)
-            except Exception:
-                logger.exception("LLM summarization failed, falling back to extractive for %s", item_id)
-                s = summarize_text(source_text)
-        else:
-            s = summarize_text(source_text)
-        if not s:
-            continue
-        if dry_run:
-            print(f"- {item_id}: {s}")
-        else:
+    use_gemini = os.environ.get("USE_GEMINI", "0") in ("1", "true", "True")
+    workers = max(1, int(os.environ.get("SUMMARIZE_WORKERS", "4"))) if use_gemini else 1
+    batch_size = max(1, int(os.environ.get("GEMINI_BATCH_SIZE", "1"))) if use_gemini else 1
+
+    max_input = int(os.environ.get("LLM_MAX_INPUT_TOKENS", "512"))
+    budget = get_budget()
+    compacted: dict[str, str] = {}
+
+    def source_text(row) -> str:
+        # Markup and boilerplate stripped once, for the prompt and the extractive fallback
+        item_id, title, summary, url = row
+        if item_id not in compacted:
+            compacted[item_id] = compact_abstract(summary) or title or url or ""
+        return compacted[item_id]
+
+    def prompt_text(row) -> str:
+        return compact_abstract(source_text(row), max_tokens=max_input)
+
+    def summarize_row(row) -> tuple[str, str | None]:
+        item_id = row[0]
+        try:
+            # Use the configured Google Gemini (or other) LLM endpoint. The implementation
+            # reads credentials and endpoint from environment variables. We will fall back
+            # to the local extractive summarizer on any error.
+            return item_id, summarize_with_gemini(prompt_text(row), system_prompt=ITEM_PROMPT)
+        except BudgetExhausted:
+            metrics.inc("summarize_budget_skipped_total")
+            return item_id, None
+        except Exception:
+            logger.exception("LLM summarization failed, falling back to extractive for %s", item_id)
+            metrics.inc("summarize_fallbacks_total")
+            return item_id, None
+
+    def summarize_batch(batch) -> list[tuple[str, str | None]]:
+        done = {}
+        if len(batch) > 1:
             try:
-                set_ai_summary(conn, item_id, s)
+                done = summarize_batch_with_gemini({r[0]: prompt_text(r) for r in batch})
+            except BudgetExhausted:
+                pass
             except Exception:
-                logger.exception("Failed to set ai_summary for %s", item_id)
+                logger.exception("Batch summarization of %d items failed, retrying one by one", len(batch))
+            if len(done) < len(batch):
+                logger.info("Batch returned %d/%d summaries; retrying the rest one by one", len(done), len(batch))
+        # Anything the batch did not return goes through the per-item path and its fallback
+        return [(r[0], done[r[0]]) if r[0] in done else summarize_row(r) for r in batch]
+
+    def finish(rows, futures) -> list[tuple[str, str]]:
+        results = {}
+        for f in futures:
+            results.update(f.result())
+        extractive_rows = [r for r in rows if not results.get(r[0])]
+        if extractive_rows:
+            # The extractive summarizer scores a whole chunk (or every LLM failure) in
+            # one vectorized pass; numpy is only imported when it is needed.
+            from extractive import summarize_many
+
+            with metrics.timer("summarize_extractive_seconds"):
+                texts = summarize_many([source_text(r) for r in extractive_rows])
+            results.update(zip((r[0] for r in extractive_rows), texts))
+        return [(r[0], results.get(r[0]) or "") for r in rows]
+
+    def submit(pool, rows) -> list:
+        # Workers only make API calls; the DB connection stays on this thread
+        if not use_gemini:
+            return []
+        futures = []
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i : i + batch_size]
+            # Batches go out newest first, so once the budget runs short the older items
+            # are the ones left to the extractive summarizer
+            need = sum(estimate_tokens(prompt_text(r)) for r in batch) + 256 * len(batch)
+            if budget.exhausted(need):
+                skipped = len(rows) - i
+                logger.info("LLM budget exhausted; %d item(s) get extractive summaries", skipped)
+                metrics.inc("summarize_budget_skipped_total", skipped)
+                break
+            futures.append(pool.submit(summarize_batch, batch))
+        return futures
+
+    if dry_run:
+        rows = [(r[0], r[2], r[5], r[3]) for r in found]
+        if not rows:
+            print("No items to summarize.")
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = finish(rows, submit(pool, rows))
+        for item_id, s in results:
+            if s:
+                print(f"- {item_id}: {s}")
+        return
+
+    # Newest first, so the coming digest is covered before the backlog
+    enqueue_summary_jobs(conn, [(r[0], r[7] or 0) for r in found])
+    default_claim = workers * batch_size * 8 if use_gemini else 5000
+    claim = max(1, int(os.environ.get("SUMMARIZE_CLAIM", str(default_claim))))
+    lease = int(os.environ.get("SUMMARY_LEASE_SECONDS", "900"))
+    max_attempts = max(1, int(os.environ.get("SUMMARY_MAX_ATTEMPTS", "3")))
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    queued = summary_job_counts(conn).get("pending", 0)
+    print(f"Generating summaries for {queued} queued items with {workers} worker(s), {batch_size} per request...")
+    written = 0
+
+    def settle(rows, futures):
+        nonlocal written
+        results = finish(rows, futures)
+        done = [(item_id, s) for item_id, s in results if s]
+        complete_summary_jobs(conn, done)
+        empty = [item_id for item_id, s in results if not s]
+        if empty:
+            logger.warning("No summary produced for %d item(s); they will be retried", len(empty))
+            fail_summary_jobs(conn, empty, "no summary produced", max_attempts)
+        written += len(done)
+        metrics.inc("summarize_items_total", len(done))
+
+    # The next chunk is claimed and queued while the current one finishes, so the
+    # workers never wait for a chunk boundary
+    inflight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                ids = claim_summary_jobs(conn, owner, claim, lease, max_attempts)
+                if ids:
+                    items = sorted(get_items(conn, ids), key=lambda r: r[7] or 0, reverse=True)
+                    gone = set(ids).difference(r[0] for r in items)
+                    if gone:
+                        # Leased jobs of removed items would otherwise sit until they go dead
+                        logger.info("Dropping %d summary job(s) whose items were removed", len(gone))
+                        drop_summary_jobs(conn, gone)
+                    rows = [(r[0], r[2], r[5], r[3]) for r in items]
+                    inflight.append((ids, rows, submit(pool, rows)))
+                while inflight and (not ids or len(inflight) > 1):
+                    settle(*inflight[0][1:])
+                    inflight.popleft()
+                if not ids:
+                    break
+        except BaseException as ex:
+            # Release unfinished chunks now rather than at lease expiry, and stop: the
+            # cause is probably not specific to these items
+            for ids, _rows, futures in inflight:
+                for f in futures:
+                    f.cancel()
+                fail_summary_jobs(conn, ids, repr(ex)[:500], max_attempts)
+            raise
 
+    counts = summary_job_counts(conn)
+    if counts.get("dead"):
+        logger.warning("%d summary job(s) gave up after %d attempts", counts["dead"], max_attempts)
+    logger.info("Wrote %d summaries; queue: %s", written, counts)
+    log_budget_stats()
+    log_cache_stats()
     print("Done.")
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
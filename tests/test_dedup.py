@@ -0,0 +1,48 @@
+from dedup import canonical_key, dedupe
+from store import connect
+
+
+def _item(item_id, url, title, source="Blog"):
+    return {"id": item_id, "source": source, "title": title, "url": url, "summary": ""}
+
+
+def test_arxiv_versions_and_cross_lists_share_a_key():
+    keys = {
+        canonical_key("https://arxiv.org/abs/2601.10712v1"),
+        canonical_key("http://arxiv.org/abs/2601.10712v3"),
+        canonical_key("https://arxiv.org/pdf/2601.10712v2#page=3"),
+        canonical_key("https://www.arxiv.org/abs/2601.10712?context=cs.LG"),
+    }
+    assert keys == {"arxiv:2601.10712"}
+
+
+def test_tracking_parameters_and_cosmetics_are_ignored():
+    a = canonical_key("https://www.example.com/post/?utm_source=x&fbclid=y")
+    b = canonical_key("http://example.com/post")
+    assert a == b
+
+
+def test_anchors_and_content_parameters_stay_distinct():
+    assert canonical_key("https://github.com/o/r/releases#v1.2") != canonical_key("https://github.com/o/r/releases#v1.3")
+    assert canonical_key("https://example.com/feed?source=blog") != canonical_key("https://example.com/feed?source=news")
+    assert canonical_key("https://example.com/a?ref=main") != canonical_key("https://example.com/a?ref=dev")
+
+
+def test_items_without_a_link_are_keyed_by_id():
+    assert canonical_key("", "a") != canonical_key("  ", "b")
+    assert canonical_key("", "a") == "id:a"
+
+
+def test_dedupe_merges_only_real_duplicates(tmp_path):
+    conn = connect(str(tmp_path / "items.sqlite"))
+    items = [
+        _item("1", "https://arxiv.org/abs/2601.10712v1", "Agents that plan", "arXiv cs.AI"),
+        _item("2", "https://arxiv.org/abs/2601.10712v2", "Agents that plan", "arXiv cs.LG"),
+        _item("3", "https://github.com/o/r/releases#v1.2", "v1.2"),
+        _item("4", "https://github.com/o/r/releases#v1.3", "v1.3"),
+        _item("5", "", "Untitled note one"),
+        _item("6", "", "Untitled note two"),
+    ]
+    fresh, duplicates = dedupe(conn, items)
+    assert [it["id"] for it in fresh] == ["1", "3", "4", "5", "6"]
+    assert duplicates == [("1", "arXiv cs.LG", "https://arxiv.org/abs/2601.10712v2")]
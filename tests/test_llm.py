@@ -0,0 +1,47 @@
+from llm import compact_abstract, estimate_tokens
+
+
+def test_html_and_entities_are_stripped():
+    text = "<p>We study <b>tool use</b> &amp; planning in LLM&nbsp;agents.</p>"
+    assert compact_abstract(text) == "We study tool use & planning in LLM agents."
+
+
+def test_arxiv_prefix_and_trailing_metadata_are_cut():
+    text = (
+        "arXiv:2601.10712v1 Announce Type: new Abstract: Agents plan better with memory."
+        " Comments: 12 pages, 4 figures"
+    )
+    assert compact_abstract(text) == "Agents plan better with memory."
+
+
+def test_latex_markup_is_unwrapped():
+    text = r"We propose \textbf{\emph{ReAct}}~\cite{yao2023} with $\alpha$-scaling on 50\% of tasks \ref{tab:1}."
+    assert compact_abstract(text) == "We propose ReAct with alpha-scaling on 50% of tasks."
+
+
+def test_urls_are_removed_from_sentences_with_content():
+    text = "We evaluate on SWE-bench (https://swebench.com) and a new suite."
+    assert compact_abstract(text) == "We evaluate on SWE-bench and a new suite."
+
+
+def test_sentences_that_only_point_at_code_are_dropped():
+    for pointer in (
+        "Code is available at https://github.com/x/y.",
+        "Our code and data are publicly released at github.com/x/y.",
+        "Project page: https://example.org/proj.",
+        "See https://example.org for details.",
+    ):
+        assert compact_abstract("Results improve 20%. " + pointer) == "Results improve 20%."
+
+
+def test_questions_keep_their_mark_after_a_url_is_removed():
+    text = "Can agents read https://example.org/docs without help?"
+    assert compact_abstract(text) == "Can agents read without help?"
+
+
+def test_max_tokens_cuts_at_a_sentence_boundary():
+    first = "Agents plan better with memory."
+    text = first + " " + "Long follow-up sentence about evaluation. " * 10
+    assert compact_abstract(text, max_tokens=estimate_tokens(first) + 1) == first
+    # The first sentence is always kept, even when it alone is over budget
+    assert compact_abstract(text, max_tokens=1) == first